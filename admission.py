@@ -0,0 +1,250 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Collection, Deque, Dict, Optional
+
+from telemetry import ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Interactive waiters are always woken first
+LANES = (INTERACTIVE, BULK)
+
+
+class OverloadedError(Exception):
+    """Raised when a request cannot be admitted: its lane's wait queue is full or the wait timed out"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Caps the documents a worker processes at once, with a short bounded wait queue per lane
+
+    Requests that cannot start and cannot queue are rejected at once instead of piling up
+    behind the cap. reserved_interactive slots are only ever given to the interactive lane,
+    so bulk traffic cannot starve requests from the UI.
+    """
+
+    def __init__(self, max_active: int, max_queue: int = 64, max_wait: float = 10.0, reserved_interactive: int = 0):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.reserved_interactive = min(reserved_interactive, max_active - 1)
+        self.active = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        # Moving average of how long a request holds its slot, for Retry-After estimates
+        self._hold_seconds = 1.0
+
+    def _capacity(self, lane: str) -> int:
+        return self.max_active if lane == INTERACTIVE else self.max_active - self.reserved_interactive
+
+    def retry_after(self) -> float:
+        """Seconds until the current queue has probably drained"""
+        queued = sum(len(waiters) for waiters in self._waiters.values())
+        return max(1.0, math.ceil(self._hold_seconds * (queued + 1) / self.max_active))
+
+    def _wake(self) -> None:
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters and self.active < self._capacity(lane):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    # The slot is handed over directly so a newcomer cannot take it first
+                    self.active += 1
+                    waiter.set_result(None)
+            ADMISSION_QUEUED.set(len(waiters), lane=lane)
+        ADMISSION_ACTIVE.set(self.active)
+
+    async def _acquire(self, lane: str) -> None:
+        waiters = self._waiters[lane]
+        if self.active < self._capacity(lane) and not waiters:
+            self.active += 1
+            ADMISSION_ACTIVE.set(self.active)
+            return
+        if len(waiters) >= self.max_queue:
+            ADMISSION_REJECTED.inc(lane=lane, reason="queue_full")
+            raise OverloadedError(f"Server is at capacity ({len(waiters)} {lane} requests waiting)", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        ADMISSION_QUEUED.set(len(waiters), lane=lane)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as the wait ended; give it to the next waiter
+                self._release()
+            else:
+                waiter.cancel()
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                ADMISSION_QUEUED.set(len(waiters), lane=lane)
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTED.inc(lane=lane, reason="timeout")
+                raise OverloadedError(
+                    f"Server is at capacity (no slot within {self.max_wait:g}s)", self.retry_after()
+                ) from None
+            raise
+        finally:
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, lane=lane)
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, lane: str = BULK) -> AsyncIterator[None]:
+        """Hold one processing slot for the duration of the block, raising OverloadedError if none is available"""
+        await self._acquire(lane)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.perf_counter() - start)
+            self._release()
+
+
+async def send_error(send: Callable, status: int, detail: str, headers: Optional[Dict[str, str]] = None) -> None:
+    """Send a FastAPI-style JSON error response from ASGI middleware"""
+    body = json.dumps({"detail": detail}).encode()
+    raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    raw_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def header_value(scope: dict, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class BodyLimitMiddleware:
+    """Reject request bodies above a size limit while they are being received
+
+    A declared Content-Length over the limit is refused before anything is read; otherwise
+    the body is counted as it streams in and the request is answered with 413 as soon as it
+    crosses the limit, without buffering the rest.
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = self.path_limits.get(scope["path"], self.max_bytes)
+        if limit <= 0:
+            return await self.app(scope, receive, send)
+        declared = header_value(scope, b"content-length")
+        if declared and declared.isdigit() and int(declared) > limit:
+            return await send_error(send, 413, f"Request body exceeds {limit} bytes")
+
+        received = 0
+        rejected = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    if not started:
+                        await send_error(send, 413, f"Request body exceeds {limit} bytes")
+                    # The app sees a disconnected client and stops reading
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
+
+
+class AdmissionMiddleware:
+    """Admit POSTs to the given paths through an AdmissionController before their bodies are read
+
+    The slot is held until the response, including a streamed body, is complete. Overloaded
+    requests get 503 with Retry-After.
+    """
+
+    def __init__(self, app, controller: AdmissionController, paths: Collection[str], lane_for: Callable[[dict], str]):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+        self.lane_for = lane_for
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        try:
+            async with self.controller.slot(self.lane_for(scope)):
+                await self.app(scope, receive, send)
+        except OverloadedError as e:
+            await send_error(send, 503, str(e), {"Retry-After": str(int(e.retry_after))})
+
+
+def priority_lane(interactive_keys: Collection[str], trusted_hosts: Collection[str] = ()) -> Callable[[dict], str]:
+    """Lane resolver: interactive for a listed API key or a trusted client's X-Priority: interactive, else bulk
+
+    Any client can send the header, so it is only believed from trusted_hosts (such as the
+    Streamlit UI on the same machine); remote clients get the interactive lane through their key.
+    """
+    keys = set(interactive_keys)
+    hosts = set(trusted_hosts)
+
+    def lane_for(scope: dict) -> str:
+        if keys and header_value(scope, b"x-api-key") in keys:
+            return INTERACTIVE
+        client = scope.get("client")
+        if hosts and client and client[0] in hosts:
+            if (header_value(scope, b"x-priority") or "").strip().lower() == INTERACTIVE:
+                return INTERACTIVE
+        return BULK
+
+    return lane_for
+
+
+def lane_resolver_from_env() -> Callable[[dict], str]:
+    """Lane resolver configured by OCR_ADMISSION_INTERACTIVE_KEYS and OCR_ADMISSION_TRUSTED_HOSTS (comma-separated)"""
+    keys = os.environ.get("OCR_ADMISSION_INTERACTIVE_KEYS", "")
+    hosts = os.environ.get("OCR_ADMISSION_TRUSTED_HOSTS", "127.0.0.1,::1")
+    return priority_lane(
+        [key.strip() for key in keys.split(",") if key.strip()],
+        [host.strip() for host in hosts.split(",") if host.strip()],
+    )
+
+
+def admission_from_env(default_max_active: int) -> Optional[AdmissionController]:
+    """Create the admission controller configured by OCR_ADMISSION_* environment variables"""
+    if os.environ.get("OCR_ADMISSION_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    return AdmissionController(
+        max_active=int(os.environ.get("OCR_ADMISSION_MAX_ACTIVE", str(default_max_active))),
+        max_queue=int(os.environ.get("OCR_ADMISSION_MAX_QUEUE", "64")),
+        max_wait=float(os.environ.get("OCR_ADMISSION_MAX_WAIT_SECONDS", "10")),
+        reserved_interactive=int(os.environ.get("OCR_ADMISSION_RESERVED_INTERACTIVE", "4")),
+    )
@@ -1,37 +1,98 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Depends, Query, Request, Response, Body
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from mistralai import Mistral
 from mistralai import ImageURLChunk, TextChunk, DocumentURLChunk
 from pathlib import Path
-import base64
+from contextlib import asynccontextmanager
+import asyncio
 import json
+import logging
 import os
-import tempfile
+import time
+import zipfile
 from pydantic import BaseModel
 from enum import Enum
-import pycountry
-from typing import Any, Dict, List, Optional, TypeVar, Type, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar, Type, Union
 from dotenv import load_dotenv
+from language_table import LANGUAGE_NAMES
+from ocr_cache import cache_key, cache_from_env
+from client_pool import pool_from_env
+from document import Document, as_document, open_content
+from document_store import store_from_env
+from admission import AdmissionMiddleware, BodyLimitMiddleware, admission_from_env, lane_resolver_from_env
+from ingest import SpoolLimitError, config_from_env as spool_config_from_env, map_path, spool_stream
+from file_registry import RegistrySweeper, key_fingerprint, registry_from_env
+from large_document import extract_pages, merge_chunk_results, pdf_page_count, split_pdf
+from text_layer import config_from_env as text_layer_config_from_env, extract_text_pages
+from prompt_compaction import compact_pages, config_from_env as compaction_config_from_env
+from markdown_parser import PARSER_VERSION, markdown_topics, parse_markdown
+from image_preprocess import config_from_env as preprocess_config_from_env, preprocess_image
+from job_queue import JobWorkerPool, QueueFullError, queue_from_env
+from rate_limit import RateLimitedError, limiter_from_env
+from schema_registry import SchemaError, response_format_for, schema_registry_from_env
+from single_flight import single_flight_from_env
+from telemetry import (
+    COALESCED_CALLS, DOCUMENT_PAGES, HTTP_IN_FLIGHT, HTTP_REQUESTS, HTTP_SECONDS, PAYLOAD_BYTES, PDF_PAGES, PROMPT_TOKENS, REGISTRY,
+    configure_logging_from_env, server_timing_header, start_request_timings, timed,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+client_pool = pool_from_env()
+outbound_limiter = limiter_from_env()
+job_queue = queue_from_env()
+job_workers: Optional[JobWorkerPool] = None
+# Uploaded PDFs are reused by content hash instead of being uploaded again
+file_registry = registry_from_env()
+registry_sweeper: Optional[RegistrySweeper] = None
+# Fire-and-forget tasks, referenced so they are not garbage collected mid-flight
+background_tasks: set = set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks"""
+    global job_workers, registry_sweeper
+    configure_logging_from_env()
+    job_workers = JobWorkerPool(
+        job_queue,
+        process_job,
+        workers=int(os.environ.get("OCR_JOB_WORKERS", "4")),
+    )
+    job_workers.start()
+    if file_registry is not None:
+        registry_sweeper = RegistrySweeper(
+            file_registry,
+            delete_remote_file,
+            interval=float(os.environ.get("OCR_FILE_REGISTRY_SWEEP_SECONDS", "600")),
+            batch_size=int(os.environ.get("OCR_FILE_REGISTRY_SWEEP_BATCH", "50")),
+        )
+        registry_sweeper.start()
+    yield
+    await job_workers.stop()
+    if registry_sweeper is not None:
+        await registry_sweeper.stop()
+    # Let remote deletes and document indexing finish before their clients and stores close
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await client_pool.aclose()
+    if single_flight is not None and single_flight.leases is not None:
+        single_flight.leases.close()
+    if schema_registry is not None:
+        schema_registry.close()
+    if document_store is not None:
+        document_store.close()
+
 app = FastAPI(
     title="Structured OCR API",
     description="An API for extracting structured data from documents using Mistral AI OCR",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Language enum for structured output
-languages = {lang.alpha_2: lang.name for lang in pycountry.languages if hasattr(lang, 'alpha_2')}
-
-class LanguageMeta(Enum.__class__):
-    def __new__(metacls, cls, bases, classdict):
-        for code, name in languages.items():
-            classdict[name.upper().replace(' ', '_')] = name
-        return super().__new__(metacls, cls, bases, classdict)
-
-class Language(Enum, metaclass=LanguageMeta):
-    pass
+# Language enum for structured output, built from a precomputed table rather than pycountry.
+# The str mixin lets pydantic validate members with a plain string lookup.
+Language = Enum('Language', [(name.upper().replace(' ', '_'), name) for name in LANGUAGE_NAMES], type=str)
 
 class StructuredOCR(BaseModel):
     file_name: str
@@ -40,177 +101,747 @@ class StructuredOCR(BaseModel):
     ocr_contents: dict
     raw_markdown: str  # Add this field to include raw OCR text
 
+class JobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded or failed
+    file_name: str
+    attempts: int
+    progress: float
+    error: Optional[str] = None
+    result: Optional[StructuredOCR] = None
+    created_at: float
+    updated_at: float
+
+class OCRMode(str, Enum):
+    """How OCR markdown is turned into ocr_contents"""
+    OCR_ONLY = "ocr_only"  # raw markdown only, no structuring
+    LOCAL = "local"  # deterministic local markdown parser
+    LLM = "llm"  # second round-trip to a Mistral chat model
+
 class HealthResponse(BaseModel):
     status: str
     api: str
 
 T = TypeVar('T', bound=BaseModel)
 
+# Progress callback used by the streaming endpoint: (event name, JSON-serialisable payload)
+EventCallback = Callable[[str, dict], Awaitable[None]]
+
+OCR_MODEL = "mistral-ocr-latest"
+IMAGE_CHAT_MODEL = "pixtral-12b-latest"
+PDF_CHAT_MODEL = "ministral-8b-latest"
+# Rate-limiter lane for file uploads and signed URLs, which are not tied to a model
+FILES_LANE = "files"
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png')
+
+IMAGE_PREPROCESS = preprocess_config_from_env()
+
+# Uploads are hashed as they are read; large ones spill to the spool directory and are memory-mapped
+UPLOAD_SPOOL = spool_config_from_env()
+
+# PDF pages with a usable embedded text layer are converted locally instead of going to OCR
+PDF_TEXT_LAYER = text_layer_config_from_env()
+
+# Compaction of OCR markdown before it is sent to the chat model; raw_markdown stays untouched
+PROMPT_COMPACTION = compaction_config_from_env()
+
+result_cache = cache_from_env()
+
+# Every fresh result is kept and full-text indexed, so it can be found again without reprocessing
+document_store = store_from_env()
+
+# Client-registered JSON schemas for ocr_contents, compiled to response models once per worker
+schema_registry = schema_registry_from_env(StructuredOCR)
+
+# Coalesces concurrent requests for the same document, model and schema onto one pipeline run
+single_flight = single_flight_from_env()
+
+# Bound the number of documents a single worker keeps in flight against Mistral
+MAX_CONCURRENT_DOCUMENTS = int(os.environ.get("OCR_MAX_CONCURRENT_DOCUMENTS", "32"))
+_ocr_slots: Optional[asyncio.Semaphore] = None
+
+def get_ocr_slots() -> asyncio.Semaphore:
+    """Return the per-worker document semaphore, created inside the running event loop"""
+    global _ocr_slots
+    if _ocr_slots is None:
+        _ocr_slots = asyncio.Semaphore(MAX_CONCURRENT_DOCUMENTS)
+    return _ocr_slots
+
+# PDFs above this many pages are split into chunks that are OCR'd and structured concurrently
+LARGE_PDF_PAGES = int(os.environ.get("OCR_LARGE_PDF_PAGES", "20"))
+PDF_CHUNK_PAGES = int(os.environ.get("OCR_PDF_CHUNK_PAGES", "10"))
+PDF_CHUNK_PARALLELISM = int(os.environ.get("OCR_PDF_CHUNK_PARALLELISM", "4"))
+
+# Seconds between keep-alive comments on an otherwise idle event stream
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("OCR_SSE_KEEPALIVE_SECONDS", "15"))
+
+# Default and maximum per-batch parallelism for /api/structured-ocr/batch
+BATCH_PARALLELISM = int(os.environ.get("OCR_BATCH_PARALLELISM", "8"))
+MAX_BATCH_PARALLELISM = int(os.environ.get("OCR_BATCH_MAX_PARALLELISM", "32"))
+
+# Prometheus metrics at /metrics, and per-stage durations in a Server-Timing response header
+METRICS_ENABLED = os.environ.get("OCR_METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+SERVER_TIMING_ENABLED = os.environ.get("OCR_SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+# Admission control for the synchronous endpoints: a cap on requests in progress, a short wait queue per
+# priority lane, then 503 with Retry-After; checked before the upload is read. Jobs have their own queue.
+ADMITTED_PATHS = ("/api/structured-ocr", "/api/structured-ocr/stream", "/api/structured-ocr/batch")
+admission = admission_from_env(MAX_CONCURRENT_DOCUMENTS)
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, controller=admission, paths=ADMITTED_PATHS, lane_for=lane_resolver_from_env())
+
+# Request bodies over these sizes are refused with 413 while they stream in, not after they are buffered
+MAX_UPLOAD_BYTES = int(os.environ.get("OCR_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_BATCH_UPLOAD_BYTES = int(os.environ.get("OCR_MAX_BATCH_UPLOAD_BYTES", str(500 * 1024 * 1024)))
+# Added after admission so it runs first and oversized requests never take a slot
+app.add_middleware(BodyLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, path_limits={"/api/structured-ocr/batch": MAX_BATCH_UPLOAD_BYTES})
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count and time every request and optionally report stage timings via Server-Timing"""
+    timings = start_request_timings()
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        HTTP_IN_FLIGHT.dec()
+        # Label by route template, not the raw path, so job IDs don't explode the series count
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=str(status))
+        HTTP_SECONDS.observe(elapsed, method=request.method, route=route)
+    if SERVER_TIMING_ENABLED:
+        # Streaming responses only report the stages that ran before their headers were sent
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+def models_for_file(file_path: Union[str, Document], mode: OCRMode = OCRMode.LLM) -> tuple[str, str]:
+    """Return the OCR and structuring model names used for a given file type and mode"""
+    file_name = file_path.file_name if isinstance(file_path, Document) else file_path
+    if mode == OCRMode.OCR_ONLY:
+        return OCR_MODEL, mode.value
+    if mode == OCRMode.LOCAL:
+        return OCR_MODEL, f"{mode.value}:{PARSER_VERSION}"
+    if Path(file_name).suffix.lower() == '.pdf':
+        return OCR_MODEL, PDF_CHAT_MODEL
+    return OCR_MODEL, IMAGE_CHAT_MODEL
+
 def get_mistral_client(api_key: Optional[str] = None) -> Mistral:
-    """Get Mistral client using provided API key or environment variable"""
+    """Get a pooled Mistral client using provided API key or environment variable"""
     key = api_key or os.environ.get("MISTRAL_API_KEY")
     if not key:
         raise HTTPException(status_code=401, detail="Mistral API key not provided")
-    return Mistral(api_key=key)
+    return client_pool.get(key)
 
-def process_image_ocr(image_path: str, api_key: Optional[str] = None) -> dict:
-    """Process an image with OCR and return the raw OCR result"""
-    client = get_mistral_client(api_key)
+def account_for(api_key: Optional[str]) -> str:
+    """Fingerprint of the API key a request runs under; what the request stores belongs to that account"""
+    return key_fingerprint(api_key or os.environ.get("MISTRAL_API_KEY", ""))
+
+def stored_account(api_key: Optional[str]) -> Optional[str]:
+    """Account the document store keeps a request's result under, or None if it is not kept
+    
+    Only the caller's own X-API-Key counts: results of keyless requests (run with the server's key) are
+    not stored, as reading them back would take that key. require_account applies the same rule.
+    """
+    return key_fingerprint(api_key) if api_key else None
+
+async def call_mistral(api_key: Optional[str], model: str, request: Callable[[], Awaitable[Any]], tokens: int = 0, stage: Optional[str] = None, idempotent: bool = True) -> Any:
+    """Send one Mistral call through the shared outbound limiter, retrying only this call on 429/5xx
+    
+    The stage (default: the model name) is timed including limiter waits and retries.
+    """
+    with timed(stage or model):
+        return await outbound_limiter.call(api_key or os.environ.get("MISTRAL_API_KEY", ""), model, request, tokens, idempotent=idempotent)
+
+async def parse_chat_async(client: Mistral, api_key: Optional[str], model: str, messages: list, response_model: Type[T], prompt_text: str) -> T:
+    """Structure OCR output with a JSON-schema chat completion, budgeting roughly four characters per token
     
-    image_file = Path(image_path)
-    encoded_image = base64.b64encode(image_file.read_bytes()).decode()
-    base64_data_url = f"data:image/jpeg;base64,{encoded_image}"
+    Same request as chat.parse, but the response format is built once per model and the reply is validated
+    straight from its JSON text.
+    """
+    chat_response = await call_mistral(api_key, model, lambda: client.chat.complete_async(
+        model=model,
+        messages=messages,
+        response_format=response_format_for(response_model),
+        temperature=0
+    ), tokens=len(prompt_text) // 4 + 1, stage="chat")
+    with timed("validate"):
+        return response_model.model_validate_json(chat_response.choices[0].message.content)
+
+def process_image_ocr(image: Union[str, Document], api_key: Optional[str] = None) -> dict:
+    """Process an image (path or Document) with OCR and return the raw OCR result"""
+    client = get_mistral_client(api_key)
+    document = as_document(image)
     
     # Process image with OCR
-    image_response = client.ocr.process(
-        document=ImageURLChunk(image_url=base64_data_url), 
-        model="mistral-ocr-latest"
-    )
+    with timed("ocr"):
+        image_response = client.ocr.process(
+            document=ImageURLChunk(image_url=document.data_url), 
+            model=OCR_MODEL
+        )
     
     return json.loads(image_response.model_dump_json())
 
-def process_pdf_ocr(pdf_path: str, api_key: Optional[str] = None) -> dict:
-    """Process a PDF with OCR and return the raw OCR result"""
+async def process_image_ocr_async(image: Union[str, Document], api_key: Optional[str] = None) -> dict:
+    """Async variant of process_image_ocr"""
     client = get_mistral_client(api_key)
+    document = as_document(image)
     
-    pdf_file = Path(pdf_path)
+    image_response = await call_mistral(api_key, OCR_MODEL, lambda: client.ocr.process_async(
+        document=ImageURLChunk(image_url=document.data_url), 
+        model=OCR_MODEL
+    ), stage="ocr")
+    
+    return json.loads(image_response.model_dump_json())
+
+def process_pdf_ocr(pdf: Union[str, Document], api_key: Optional[str] = None) -> dict:
+    """Process a PDF (path or Document) with OCR and return the raw OCR result"""
+    client = get_mistral_client(api_key)
+    document = as_document(pdf)
     
     # Upload file for OCR
-    uploaded_file = client.files.upload(
+    with timed("files_upload"):
+        uploaded_file = client.files.upload(
+            file={
+                "file_name": document.stem,
+                "content": document.content,
+            },
+            purpose="ocr",
+        )
+    
+    # Get signed URL
+    with timed("signed_url"):
+        signed_url = client.files.get_signed_url(file_id=uploaded_file.id, expiry=1)
+    
+    # Process PDF with OCR
+    with timed("ocr"):
+        pdf_response = client.ocr.process(
+            document=DocumentURLChunk(document_url=signed_url.url), 
+            model=OCR_MODEL, 
+            include_image_base64=False
+        )
+    
+    return json.loads(pdf_response.model_dump_json())
+
+def finish_background_task(task: asyncio.Future) -> None:
+    """Drop a finished fire-and-forget task, logging its failure instead of losing it"""
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Background task failed: {task.exception()}")
+
+async def delete_remote_file(api_key: Optional[str], file_id: str) -> None:
+    """Delete an uploaded file from Mistral"""
+    client = get_mistral_client(api_key)
+    await call_mistral(api_key, FILES_LANE, lambda: client.files.delete_async(file_id=file_id), stage="files_delete")
+
+async def pdf_document_url(client: Mistral, document: Document, api_key: Optional[str]) -> tuple[str, str, bool]:
+    """Return (file ID, signed URL, reused) for a PDF, uploading it only if the registry has no live copy"""
+    registry_key = api_key or os.environ.get("MISTRAL_API_KEY", "")
+    entry = None
+    if file_registry is not None:
+        entry = await asyncio.to_thread(file_registry.lookup, registry_key, document.sha256)
+    if entry is not None and entry["url"]:
+        file_registry.stats["uploads_skipped"] += 1
+        file_registry.stats["urls_reused"] += 1
+        return entry["file_id"], entry["url"], True
+    
+    expiry = file_registry.url_expiry_hours if file_registry is not None else 1
+    if entry is not None:
+        try:
+            signed_url = await call_mistral(api_key, FILES_LANE, lambda: client.files.get_signed_url_async(file_id=entry["file_id"], expiry=expiry), stage="signed_url")
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            logger.info("Registered file is no longer available, uploading again", extra={"file_id": entry["file_id"], "error": str(e)})
+            await asyncio.to_thread(file_registry.forget, registry_key, document.sha256)
+        else:
+            await asyncio.to_thread(file_registry.record, registry_key, document.sha256, entry["file_id"], signed_url.url)
+            file_registry.stats["uploads_skipped"] += 1
+            return entry["file_id"], signed_url.url, True
+    
+    content = document.as_bytes()
+    uploaded_file = await call_mistral(api_key, FILES_LANE, lambda: client.files.upload_async(
         file={
-            "file_name": pdf_file.stem,
-            "content": pdf_file.read_bytes(),
+            "file_name": document.stem,
+            "content": content,
         },
         purpose="ocr",
-    )
+    ), stage="files_upload", idempotent=False)
     
-    # Get signed URL
-    signed_url = client.files.get_signed_url(file_id=uploaded_file.id, expiry=1)
+    signed_url = await call_mistral(api_key, FILES_LANE, lambda: client.files.get_signed_url_async(file_id=uploaded_file.id, expiry=expiry), stage="signed_url")
+    if file_registry is not None:
+        file_registry.stats["uploads"] += 1
+        await asyncio.to_thread(file_registry.record, registry_key, document.sha256, uploaded_file.id, signed_url.url)
+    return uploaded_file.id, signed_url.url, False
+
+async def remote_pdf_ocr_async(document: Document, api_key: Optional[str] = None) -> dict:
+    """OCR a whole PDF with Mistral, reusing a previously uploaded copy of the same bytes"""
+    client = get_mistral_client(api_key)
     
-    # Process PDF with OCR
-    pdf_response = client.ocr.process(
-        document=DocumentURLChunk(document_url=signed_url.url), 
-        model="mistral-ocr-latest", 
-        include_image_base64=False
-    )
+    async def ocr(document_url: str):
+        return await call_mistral(api_key, OCR_MODEL, lambda: client.ocr.process_async(
+            document=DocumentURLChunk(document_url=document_url), 
+            model=OCR_MODEL, 
+            include_image_base64=False
+        ), stage="ocr")
+    
+    file_id, document_url, reused = await pdf_document_url(client, document, api_key)
+    try:
+        pdf_response = await ocr(document_url)
+    except RateLimitedError:
+        raise
+    except Exception as e:
+        if not reused:
+            raise
+        # The remote copy may have been deleted or its URL revoked; upload afresh once
+        logger.info("Reused file failed OCR, uploading again", extra={"file_id": file_id, "error": str(e)})
+        await asyncio.to_thread(file_registry.forget, api_key or os.environ.get("MISTRAL_API_KEY", ""), document.sha256)
+        file_id, document_url, _ = await pdf_document_url(client, document, api_key)
+        pdf_response = await ocr(document_url)
+    
+    if file_registry is None:
+        # Nothing will reuse the upload, so don't leave it behind on Mistral's side
+        task = asyncio.ensure_future(delete_remote_file(api_key, file_id))
+        background_tasks.add(task)
+        task.add_done_callback(finish_background_task)
     
     return json.loads(pdf_response.model_dump_json())
 
-def structured_ocr(file_path: str, api_key: Optional[str] = None, response_model: Type[T] = StructuredOCR) -> T:
-    """Process a file and return structured OCR output"""
+async def process_pdf_ocr_async(pdf: Union[str, Document], api_key: Optional[str] = None) -> dict:
+    """Async variant of process_pdf_ocr with page-level routing
+    
+    Pages with a usable embedded text layer are converted to markdown locally; only scanned or
+    image-only pages are sent to Mistral OCR, as one PDF of just those pages.
+    """
+    document = as_document(pdf)
+    with timed("text_layer"):
+        text_pages = await asyncio.to_thread(extract_text_pages, document.content, PDF_TEXT_LAYER)
+    ocr_indexes = [index for index, page in enumerate(text_pages) if page is None]
+    if not text_pages or len(ocr_indexes) == len(text_pages):
+        PDF_PAGES.inc(len(text_pages), source="ocr")
+        return await remote_pdf_ocr_async(document, api_key)
+    
+    if not ocr_indexes:
+        PDF_PAGES.inc(len(text_pages), source="text_layer")
+        return {"pages": text_pages, "model": "text-layer", "usage_info": {"pages_processed": 0, "doc_size_bytes": len(document.content)}}
+    
+    with timed("split_pdf"):
+        try:
+            subset = Document(
+                file_name=f"{document.stem}-ocr.pdf",
+                content=await asyncio.to_thread(extract_pages, document.content, ocr_indexes),
+            )
+        except Exception as e:
+            # pypdf read the pages but could not write them out again
+            logger.warning(f"Could not extract pages for OCR, sending the whole PDF: {e!r}")
+            subset = None
+    if subset is None:
+        PDF_PAGES.inc(len(text_pages), source="ocr")
+        return await remote_pdf_ocr_async(document, api_key)
+    
+    PDF_PAGES.inc(len(text_pages) - len(ocr_indexes), source="text_layer")
+    PDF_PAGES.inc(len(ocr_indexes), source="ocr")
+    ocr_result = await remote_pdf_ocr_async(subset, api_key)
+    pages = list(text_pages)
+    for index, page in zip(ocr_indexes, ocr_result["pages"]):
+        pages[index] = {**page, "index": index}
+    ocr_result["pages"] = [page for page in pages if page is not None]
+    return ocr_result
+
+def image_chat_messages(document: Document, image_ocr_markdown: str) -> list:
+    """Build the chat messages that ask the vision model to structure an image's OCR"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                # Same data URL the OCR stage already encoded
+                ImageURLChunk(image_url=document.data_url),
+                TextChunk(text=(
+                    "This is the image's OCR in markdown:\n"
+                    f"<BEGIN_IMAGE_OCR>\n{image_ocr_markdown}\n<END_IMAGE_OCR>.\n"
+                    "Convert this into a structured JSON response with the OCR contents in a sensible dictionary."
+                ))
+            ],
+        },
+    ]
+
+def pdf_chat_messages(pdf_ocr_markdown: str) -> list:
+    """Build the chat messages that ask the text model to structure a PDF's OCR"""
+    return [
+        {
+            "role": "user",
+            "content": (
+                "This is the PDF's OCR in markdown:\n"
+                f"<BEGIN_PDF_OCR>\n{pdf_ocr_markdown}\n<END_PDF_OCR>.\n"
+                "Convert this into a structured JSON response with the OCR contents in a sensible dictionary."
+            )
+        },
+    ]
+
+def attach_raw_markdown(parsed_result: T, raw_markdown: str, response_model: Type[T]) -> T:
+    """Add the raw OCR markdown to an already validated chat result"""
+    logger.debug("Attaching raw markdown", extra={"markdown_chars": len(raw_markdown), "snippet": raw_markdown[:100]})
+    PAYLOAD_BYTES.observe(len(raw_markdown.encode()), kind="markdown")
+    if isinstance(parsed_result, response_model):
+        # Validated when it was parsed; replacing a plain string field needs no second pass
+        return parsed_result.model_copy(update={"raw_markdown": raw_markdown})
+    with timed("validate"):
+        return response_model.model_validate({**parsed_result.model_dump(), "raw_markdown": raw_markdown})
+
+def structured_ocr(file_path: Union[str, Document], api_key: Optional[str] = None, response_model: Type[T] = StructuredOCR) -> T:
+    """Process a file (path or Document) and return structured OCR output"""
     client = get_mistral_client(api_key)
-    file_extension = Path(file_path).suffix.lower()
+    document = as_document(file_path)
+    file_extension = document.extension
     
     if file_extension in ['.jpg', '.jpeg', '.png']:
         # Image processing
-        ocr_result = process_image_ocr(file_path, api_key)
+        with timed("preprocess"):
+            document, _ = preprocess_image(document, IMAGE_PREPROCESS)
+        ocr_result = process_image_ocr(document, api_key)
         image_ocr_markdown = ocr_result["pages"][0]["markdown"]
-        
-        # Encode image again for the chat model
-        image_file = Path(file_path)
-        encoded_image = base64.b64encode(image_file.read_bytes()).decode()
-        base64_data_url = f"data:image/jpeg;base64,{encoded_image}"
+        prompt_markdown, _ = compact_pages([image_ocr_markdown], PROMPT_COMPACTION)
         
         # Parse OCR result into structured JSON
-        chat_response = client.chat.parse(
-            model="pixtral-12b-latest",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        ImageURLChunk(image_url=base64_data_url),
-                        TextChunk(text=(
-                            "This is the image's OCR in markdown:\n"
-                            f"<BEGIN_IMAGE_OCR>\n{image_ocr_markdown}\n<END_IMAGE_OCR>.\n"
-                            "Convert this into a structured JSON response with the OCR contents in a sensible dictionary."
-                        ))
-                    ],
-                },
-            ],
-            response_format=response_model,
-            temperature=0
-        )
-        
-        parsed_result = chat_response.choices[0].message.parsed
-        
-        # Add the raw markdown to the result
-        parsed_dict = json.loads(parsed_result.model_dump_json())
-        parsed_dict["raw_markdown"] = image_ocr_markdown
-        
-        # Log the raw markdown for debugging
-        print(f"Raw markdown length: {len(image_ocr_markdown)}")
-        print(f"Raw markdown snippet: {image_ocr_markdown[:100]}...")
-        
-        # Convert back to response model
-        return response_model.model_validate(parsed_dict)
+        with timed("chat"):
+            chat_response = client.chat.parse(
+                model=IMAGE_CHAT_MODEL,
+                messages=image_chat_messages(document, prompt_markdown),
+                response_format=response_model,
+                temperature=0
+            )
+        return attach_raw_markdown(chat_response.choices[0].message.parsed, image_ocr_markdown, response_model)
     
     elif file_extension == '.pdf':
         # PDF processing
-        ocr_result = process_pdf_ocr(file_path, api_key)
+        ocr_result = process_pdf_ocr(document, api_key)
         pdf_ocr_markdown = "\n\n".join([page["markdown"] for page in ocr_result["pages"]])
+        prompt_markdown, _ = compact_pages([page["markdown"] for page in ocr_result["pages"]], PROMPT_COMPACTION)
         
         # Parse OCR result into structured JSON
-        chat_response = client.chat.parse(
-            model="ministral-8b-latest",
-            messages=[
-                {
-                    "role": "user",
-                    "content": (
-                        "This is the PDF's OCR in markdown:\n"
-                        f"<BEGIN_PDF_OCR>\n{pdf_ocr_markdown}\n<END_PDF_OCR>.\n"
-                        "Convert this into a structured JSON response with the OCR contents in a sensible dictionary."
-                    )
-                },
-            ],
-            response_format=response_model,
-            temperature=0
+        with timed("chat"):
+            chat_response = client.chat.parse(
+                model=PDF_CHAT_MODEL,
+                messages=pdf_chat_messages(prompt_markdown),
+                response_format=response_model,
+                temperature=0
+            )
+        return attach_raw_markdown(chat_response.choices[0].message.parsed, pdf_ocr_markdown, response_model)
+    
+    else:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+def structure_locally(document: Document, markdown: str, mode: OCRMode, response_model: Type[T] = StructuredOCR) -> T:
+    """Build the response from OCR markdown alone, without a chat model call
+    
+    ocr_only leaves ocr_contents empty; local fills it with the deterministic markdown parser.
+    """
+    with timed("local_parse"):
+        PAYLOAD_BYTES.observe(len(markdown.encode()), kind="markdown")
+        return response_model.model_validate({
+            "file_name": document.stem,
+            "topics": markdown_topics(markdown) if mode == OCRMode.LOCAL else [],
+            "languages": [],
+            "ocr_contents": parse_markdown(markdown) if mode == OCRMode.LOCAL else {},
+            "raw_markdown": markdown,
+        })
+
+async def compact_prompt(pages: List[str], on_event: Optional[EventCallback] = None) -> str:
+    """Compact OCR page markdown for the chat model and report the tokens saved"""
+    with timed("compaction"):
+        markdown, stats = compact_pages(pages, PROMPT_COMPACTION)
+    PROMPT_TOKENS.inc(stats.original_tokens, kind="original")
+    PROMPT_TOKENS.inc(stats.compacted_tokens, kind="compacted")
+    if on_event is not None:
+        await on_event("compacted", {
+            "original_tokens": stats.original_tokens,
+            "compacted_tokens": stats.compacted_tokens,
+            "tokens_saved": stats.tokens_saved,
+        })
+    return markdown
+
+async def emit_pages(on_event: Optional[EventCallback], pages: List[dict], first_page: int = 0) -> None:
+    """Report OCR markdown for each page, with page indexes relative to the whole document"""
+    if on_event is None:
+        return
+    for offset, page in enumerate(pages):
+        await on_event("page", {"index": first_page + offset, "markdown": page["markdown"]})
+
+async def structured_large_pdf_async(document: Document, api_key: Optional[str] = None, response_model: Type[T] = StructuredOCR, on_event: Optional[EventCallback] = None, structure_chunks: bool = True, mode: OCRMode = OCRMode.LLM) -> T:
+    """Split a large PDF into page ranges, OCR and structure them concurrently, then merge the chunks
+    
+    With structure_chunks=False only the OCR is split; the joined markdown is structured in one call.
+    Outside llm mode the joined markdown is structured locally instead.
+    """
+    structure_chunks = structure_chunks and mode == OCRMode.LLM
+    client = get_mistral_client(api_key)
+    with timed("split_pdf"):
+        chunks = await asyncio.to_thread(split_pdf, document.content, PDF_CHUNK_PAGES)
+    chunk_slots = asyncio.Semaphore(PDF_CHUNK_PARALLELISM)
+    
+    async def process_chunk(first_page: int, content: bytes) -> tuple[List[str], Optional[dict]]:
+        async with chunk_slots:
+            chunk = Document(file_name=f"{document.stem}-p{first_page + 1}.pdf", content=content)
+            ocr_result = await process_pdf_ocr_async(chunk, api_key)
+            await emit_pages(on_event, ocr_result["pages"], first_page)
+            page_markdown = [page["markdown"] for page in ocr_result["pages"]]
+            if not structure_chunks:
+                return page_markdown, None
+            
+            prompt_markdown = await compact_prompt(page_markdown, on_event)
+            parsed_result = await parse_chat_async(
+                client, api_key, PDF_CHAT_MODEL, pdf_chat_messages(prompt_markdown), response_model, prompt_markdown
+            )
+            return page_markdown, parsed_result.model_dump(mode="json")
+    
+    # gather keeps chunk order, so the merge is deterministic regardless of completion order
+    chunk_results = await asyncio.gather(*[process_chunk(first_page, content) for first_page, content in chunks])
+    all_pages = [markdown for page_markdown, _ in chunk_results for markdown in page_markdown]
+    pdf_ocr_markdown = "\n\n".join(all_pages)
+    
+    if mode != OCRMode.LLM:
+        return structure_locally(document, pdf_ocr_markdown, mode, response_model)
+    
+    if not structure_chunks:
+        if on_event is not None:
+            await on_event("structuring", {"pages": len(all_pages)})
+        prompt_markdown = await compact_prompt(all_pages, on_event)
+        parsed_result = await parse_chat_async(
+            client, api_key, PDF_CHAT_MODEL, pdf_chat_messages(prompt_markdown), response_model, prompt_markdown
         )
-        
-        parsed_result = chat_response.choices[0].message.parsed
-        
-        # Add the raw markdown to the result
-        parsed_dict = json.loads(parsed_result.model_dump_json())
+        return attach_raw_markdown(parsed_result, pdf_ocr_markdown, response_model)
+    
+    with timed("validate"):
+        # A registered schema types every field, so conflicting scalars cannot become lists there
+        parsed_dict = merge_chunk_results([parsed for _, parsed in chunk_results], keep_first=response_model is not StructuredOCR)
         parsed_dict["raw_markdown"] = pdf_ocr_markdown
+        logger.info("Merged PDF chunks", extra={"chunks": len(chunks), "markdown_chars": len(pdf_ocr_markdown)})
+        PAYLOAD_BYTES.observe(len(pdf_ocr_markdown.encode()), kind="markdown")
+        return response_model.model_validate(parsed_dict)
+
+async def structured_ocr_async(file_path: Union[str, Document], api_key: Optional[str] = None, response_model: Type[T] = StructuredOCR, on_event: Optional[EventCallback] = None, mode: OCRMode = OCRMode.LLM, stream_pages: bool = False) -> T:
+    """Async variant of structured_ocr that never blocks the event loop on network I/O
+    
+    If on_event is given it is awaited with ("page", {...}) as soon as each page's OCR
+    markdown is available and with ("structuring", {...}) before the chat model is called.
+    stream_pages also splits the OCR of PDFs above PDF_CHUNK_PAGES so early pages arrive sooner.
+    Modes other than llm skip the chat model entirely (see OCRMode).
+    """
+    client = get_mistral_client(api_key)
+    document = as_document(file_path)
+    file_extension = document.extension
+    
+    async with get_ocr_slots():
+        if file_extension in ['.jpg', '.jpeg', '.png']:
+            with timed("preprocess"):
+                document, stats = await asyncio.to_thread(preprocess_image, document, IMAGE_PREPROCESS)
+            if stats.applied:
+                PAYLOAD_BYTES.observe(stats.output_bytes, kind="preprocessed")
+                logger.info("Pre-processed image", extra={
+                    "original_size": stats.original_size,
+                    "output_size": stats.output_size,
+                    "bytes_saved": stats.bytes_saved,
+                })
+            if on_event is not None:
+                await on_event("preprocessed", {
+                    "applied": stats.applied,
+                    "original_bytes": stats.original_bytes,
+                    "output_bytes": stats.output_bytes,
+                    "bytes_saved": stats.bytes_saved,
+                })
+            
+            ocr_result = await process_image_ocr_async(document, api_key)
+            DOCUMENT_PAGES.observe(len(ocr_result["pages"]))
+            await emit_pages(on_event, ocr_result["pages"])
+            image_ocr_markdown = ocr_result["pages"][0]["markdown"]
+            if mode != OCRMode.LLM:
+                return structure_locally(document, image_ocr_markdown, mode, response_model)
+            
+            if on_event is not None:
+                await on_event("structuring", {"pages": 1})
+            prompt_markdown = await compact_prompt([image_ocr_markdown], on_event)
+            parsed_result = await parse_chat_async(
+                client, api_key, IMAGE_CHAT_MODEL, image_chat_messages(document, prompt_markdown), response_model, prompt_markdown
+            )
+            return attach_raw_markdown(parsed_result, image_ocr_markdown, response_model)
         
-        # Log the raw markdown for debugging
-        print(f"Raw markdown length: {len(pdf_ocr_markdown)}")
-        print(f"Raw markdown snippet: {pdf_ocr_markdown[:100]}...")
+        elif file_extension == '.pdf':
+            with timed("page_count"):
+                page_count = await asyncio.to_thread(pdf_page_count, document.content)
+            DOCUMENT_PAGES.observe(page_count)
+            if page_count > LARGE_PDF_PAGES:
+                return await structured_large_pdf_async(document, api_key, response_model, on_event, mode=mode)
+            if stream_pages and page_count > PDF_CHUNK_PAGES:
+                # Streaming callers want early pages, so split the OCR even below the large-document threshold
+                return await structured_large_pdf_async(document, api_key, response_model, on_event, structure_chunks=False, mode=mode)
+            
+            ocr_result = await process_pdf_ocr_async(document, api_key)
+            await emit_pages(on_event, ocr_result["pages"])
+            pdf_ocr_markdown = "\n\n".join([page["markdown"] for page in ocr_result["pages"]])
+            if mode != OCRMode.LLM:
+                return structure_locally(document, pdf_ocr_markdown, mode, response_model)
+            
+            if on_event is not None:
+                await on_event("structuring", {"pages": len(ocr_result["pages"])})
+            prompt_markdown = await compact_prompt([page["markdown"] for page in ocr_result["pages"]], on_event)
+            parsed_result = await parse_chat_async(
+                client, api_key, PDF_CHAT_MODEL, pdf_chat_messages(prompt_markdown), response_model, prompt_markdown
+            )
+            return attach_raw_markdown(parsed_result, pdf_ocr_markdown, response_model)
         
-        # Convert back to response model
-        return response_model.model_validate(parsed_dict)
+        else:
+            raise ValueError(f"Unsupported file format: {file_extension}")
+
+async def cached_structured_ocr(file_path: Union[str, Document], api_key: Optional[str] = None, cache_mode: str = "use", on_event: Optional[EventCallback] = None, mode: OCRMode = OCRMode.LLM, response_model: Type[StructuredOCR] = StructuredOCR, schema: Optional[str] = None, stream_pages: bool = False) -> tuple[str, str]:
+    """Run structured_ocr_async through the result cache and return the result JSON with its cache status
     
+    The result is validated once, when it is produced, and serialised once; cache hits return the stored
+    JSON as is, since the key pins the schema it was validated against.
+    Concurrent cache-backed calls for the same document, models, schema and API key share one run and report COALESCED;
+    they receive only the final result, not the leader's progress events. schema is the registered
+    schema name response_model was compiled from, recorded with the stored document.
+    """
+    document = as_document(file_path)
+    models = models_for_file(document, mode)
+    if document.extension != '.pdf':
+        # Pre-processing settings change what the models see
+        models = models + (IMAGE_PREPROCESS.fingerprint,)
     else:
-        raise ValueError(f"Unsupported file format: {file_extension}")
-
-async def save_upload_file(upload_file: UploadFile) -> tuple[str, str]:
-    """Save an uploaded file to a temporary location and return the path and temp dir"""
-    temp_dir = tempfile.mkdtemp()
-    file_path = os.path.join(temp_dir, upload_file.filename)
+        # As does reading pages from the text layer instead of OCR
+        models = models + (PDF_TEXT_LAYER.fingerprint,)
+        if stream_pages:
+            # And OCR split into chunks, which only streaming uses below the large-document threshold
+            page_count = await asyncio.to_thread(pdf_page_count, document.content)
+            if PDF_CHUNK_PAGES < page_count <= LARGE_PDF_PAGES:
+                models = models + (f"split:{PDF_CHUNK_PAGES}",)
+    if mode == OCRMode.LLM:
+        # So does compaction of the prompt
+        models = models + (PROMPT_COMPACTION.fingerprint,)
+    key = cache_key(document.sha256, models, response_model)
+    use_cache = result_cache is not None and cache_mode != "bypass"
     
-    # Write the file content
-    with open(file_path, "wb") as f:
-        content = await upload_file.read()
-        f.write(content)
+    async def cached_result() -> Optional[tuple[str, str]]:
+        with timed("cache_get"):
+            cached = await asyncio.to_thread(result_cache.get, key)
+        return (cached, "HIT") if cached is not None else None
     
-    # Reset file pointer for potential future reads
-    await upload_file.seek(0)
+    async def run() -> tuple[str, str]:
+        result = await structured_ocr_async(document, api_key, response_model, on_event=on_event, mode=mode, stream_pages=stream_pages)
+        with timed("serialize"):
+            payload = result.model_dump_json()
+        if use_cache:
+            with timed("cache_set"):
+                await asyncio.to_thread(result_cache.set, key, payload)
+        return payload, "MISS" if use_cache else "BYPASS"
     
-    return file_path, temp_dir
+    async def produce() -> tuple[str, str]:
+        if use_cache and cache_mode == "use":
+            hit = await cached_result()
+            if hit is not None:
+                return hit
+        if single_flight is None or not (use_cache and cache_mode == "use"):
+            # bypass and refresh promise a fresh run per request, so they neither share a run nor wait for one
+            return await run()
+        # Only calls under the same API key share a run: a follower must not get a result its own key could not
+        # have produced, nor the leader's 401/429. Across keys, results are shared only through the cache.
+        flight_key = f"{key}:{account_for(api_key)}"
+        (payload, cache_status), shared = await single_flight.do(flight_key, run, cached_result)
+        if shared:
+            COALESCED_CALLS.inc()
+            return payload, "COALESCED"
+        return payload, cache_status
+    
+    payload, cache_status = await produce()
+    account = stored_account(api_key)
+    if document_store is not None and account is not None:
+        # Indexed on every response, since a cached result may have been produced for another account;
+        # off the request path, so the caller does not wait for the store
+        task = asyncio.ensure_future(asyncio.to_thread(
+            document_store.add, account, key, document.sha256, document.file_name, mode.value, schema, payload,
+            cache_status in ("MISS", "BYPASS")
+        ))
+        background_tasks.add(task)
+        task.add_done_callback(finish_background_task)
+    return payload, cache_status
+
+async def response_model_for(schema: Optional[str], mode: OCRMode, api_key: Optional[str]) -> Type[StructuredOCR]:
+    """StructuredOCR, or its compiled variant whose ocr_contents follow a schema the caller's account registered"""
+    if schema is None:
+        return StructuredOCR
+    if schema_registry is None:
+        raise HTTPException(status_code=400, detail="The schema registry is disabled")
+    if mode != OCRMode.LLM:
+        raise HTTPException(status_code=400, detail="Registered schemas are filled by the chat model and need mode=llm")
+    compiled = await asyncio.to_thread(schema_registry.get, account_for(api_key), schema)
+    if compiled is None:
+        raise HTTPException(status_code=404, detail=f"Unknown schema: {schema}")
+    return compiled.model
+
+def embed_json(data: dict, raw_json: str, key: Optional[str] = None) -> str:
+    """Serialise data together with raw_json, an already serialised object, without parsing it again
+    
+    With a key the object is nested under it; without one its fields follow data's.
+    """
+    head = json.dumps(data)[:-1] + (", " if data else "")
+    if key is not None:
+        return f'{head}"{key}": {raw_json}}}'
+    return head + raw_json[1:]
+
+
+def retry_after_header(error: RateLimitedError) -> Dict[str, str]:
+    """Retry-After header to pass Mistral's back-off on to our own clients"""
+    return {"Retry-After": str(max(1, round(error.retry_after or 1)))}
+
+async def read_upload_document(upload_file: UploadFile) -> Document:
+    """Hash an upload into a Document, memory-mapping large ones instead of copying them to the heap
+    
+    Starlette has already spooled the multipart body to its own temporary file by the time this runs;
+    only the single hashing pass and the memory map over our spool file happen here.
+    """
+    with timed("upload"):
+        document = await asyncio.to_thread(spool_stream, upload_file.file, upload_file.filename, UPLOAD_SPOOL)
+    PAYLOAD_BYTES.observe(len(document.content), kind="upload")
+    return document
 
 def get_api_key(x_api_key: Optional[str] = Header(None)) -> Optional[str]:
     """Extract API key from headers if provided"""
     return x_api_key
 
+def require_account(api_key: Optional[str] = Depends(get_api_key)) -> str:
+    """Account of the caller's X-API-Key, for endpoints that expose what an account has stored"""
+    account = stored_account(api_key)
+    if account is None:
+        raise HTTPException(status_code=401, detail="X-API-Key header required")
+    return account
+
+def get_cache_control(x_cache_control: Optional[str] = Header(None)) -> str:
+    """Extract the cache mode (use, bypass or refresh) from headers"""
+    mode = (x_cache_control or "use").strip().lower()
+    if mode not in ("use", "bypass", "refresh"):
+        raise HTTPException(status_code=400, detail=f"Invalid X-Cache-Control value: {x_cache_control}")
+    return mode
+
 @app.post("/api/structured-ocr", response_model=StructuredOCR, summary="Extract structured data from documents")
 async def structured_ocr_endpoint(
     file: UploadFile = File(...),
-    api_key: Optional[str] = Depends(get_api_key)
+    mode: OCRMode = Query(OCRMode.LLM, description="ocr_only, local (deterministic parser) or llm"),
+    schema: Optional[str] = Query(None, description="Name of a registered schema for ocr_contents (llm mode)"),
+    api_key: Optional[str] = Depends(get_api_key),
+    cache_mode: str = Depends(get_cache_control)
 ):
     """
     Process a document with OCR and return structured data extracted from the document.
     
     - **file**: The document file (PDF, JPG, JPEG, or PNG)
+    - **mode**: (Optional) `llm` (default) structures the OCR with a chat model, `local` with a fast deterministic
+      parser (headings, tables, `Key: Value` lines), `ocr_only` returns just `raw_markdown`
+    - **schema**: (Optional) Name of a schema registered with `PUT /api/schemas/{name}`; `ocr_contents` then follows it
     - **X-API-Key**: (Optional) Mistral API key in header
+    - **X-Cache-Control**: (Optional) `bypass` to skip the result cache, `refresh` to recompute and store
     
     Returns structured data extracted from the document using Mistral's OCR and LLM capabilities.
     """
@@ -218,29 +849,342 @@ async def structured_ocr_endpoint(
     if not file:
         raise HTTPException(status_code=400, detail="No file provided")
     
-    # Save file temporarily
     try:
-        file_path, temp_dir = await save_upload_file(file)
+        response_model = await response_model_for(schema, mode, api_key)
+        document = await read_upload_document(file)
+        headers: Dict[str, str] = {}
         
-        # Process file for structured output
-        result = structured_ocr(file_path, api_key)
+        async def on_event(event: str, data: dict) -> None:
+            if event == "preprocessed":
+                headers["X-Image-Bytes-Saved"] = str(data["bytes_saved"])
+            elif event == "compacted":
+                # Large PDFs compact each chunk separately; report the total
+                saved = int(headers.get("X-Prompt-Tokens-Saved", "0")) + data["tokens_saved"]
+                headers["X-Prompt-Tokens-Saved"] = str(saved)
         
-        # Verify raw_markdown is included
-        result_dict = json.loads(result.model_dump_json())
-        if "raw_markdown" not in result_dict or not result_dict["raw_markdown"]:
-            print("Warning: raw_markdown is missing or empty in result")
+        # Process file for structured output
+        payload, cache_status = await cached_structured_ocr(document, api_key, cache_mode, on_event=on_event, mode=mode, response_model=response_model, schema=schema)
+        headers["X-Cache"] = cache_status
         
-        return result
+        # Already validated and serialised; returning it directly skips response_model re-validation
+        return Response(content=payload, media_type="application/json", headers=headers)
     
+    except HTTPException:
+        raise
+    except RateLimitedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/structured-ocr/stream", summary="Extract structured data, streaming progress as Server-Sent Events")
+async def structured_ocr_stream_endpoint(
+    file: UploadFile = File(...),
+    mode: OCRMode = Query(OCRMode.LLM, description="ocr_only, local (deterministic parser) or llm"),
+    schema: Optional[str] = Query(None, description="Name of a registered schema for ocr_contents (llm mode)"),
+    api_key: Optional[str] = Depends(get_api_key),
+    cache_mode: str = Depends(get_cache_control)
+):
+    """
+    Streaming variant of `/api/structured-ocr` that reports progress as Server-Sent Events.
     
-    finally:
-        # Clean up temporary files
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
-        if 'temp_dir' in locals() and os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
+    - **file**: The document file (PDF, JPG, JPEG, or PNG)
+    - **mode**: (Optional) `llm`, `local` or `ocr_only`, as for `/api/structured-ocr`
+    - **schema**: (Optional) Name of a registered schema, as for `/api/structured-ocr`
+    - **X-API-Key**: (Optional) Mistral API key in header
+    - **X-Cache-Control**: (Optional) `bypass` to skip the result cache, `refresh` to recompute and store
+    
+    Events, in order: `accepted`, `preprocessed` (images only), one `page` per page as its OCR markdown becomes available
+    (pages of large PDFs may arrive out of order; each carries its `index`), `structuring` and `compacted` (llm mode only),
+    then either `result` with the `StructuredOCR` payload or `error`.
+    """
+    response_model = await response_model_for(schema, mode, api_key)
+    document = await read_upload_document(file)
+    events: asyncio.Queue = asyncio.Queue()
+    
+    async def on_event(event: str, data: dict) -> None:
+        await events.put(sse_event(event, data))
+    
+    async def run_pipeline() -> None:
+        try:
+            payload, cache_status = await cached_structured_ocr(document, api_key, cache_mode, on_event=on_event, mode=mode, response_model=response_model, schema=schema, stream_pages=True)
+            await events.put(f"event: result\ndata: {embed_json({'cache': cache_status}, payload)}\n\n")
+        except HTTPException as e:
+            await events.put(sse_event("error", {"status_code": e.status_code, "detail": e.detail}))
+        except RateLimitedError as e:
+            await events.put(sse_event("error", {"status_code": 429, "detail": str(e), "retry_after": e.retry_after}))
+        except Exception as e:
+            await events.put(sse_event("error", {"status_code": 500, "detail": str(e)}))
+        finally:
+            await events.put(None)
+    
+    async def stream_events():
+        yield sse_event("accepted", {"file_name": document.file_name, "bytes": len(document.content)})
+        task = asyncio.ensure_future(run_pipeline())
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(events.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield message
+        finally:
+            task.cancel()
+    
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def expand_batch_uploads(uploads: List[Document]) -> List[Document]:
+    """Replace zip archives in a batch with their supported members, each spooled like an upload
+    
+    Decompressed members are held to the same limits as uploads: OCR_MAX_UPLOAD_BYTES each and
+    OCR_MAX_BATCH_UPLOAD_BYTES for the whole batch, so a small archive cannot expand without bound.
+    """
+    documents = []
+    remaining = MAX_BATCH_UPLOAD_BYTES
+    for upload in uploads:
+        if upload.extension != '.zip':
+            documents.append(upload)
+            remaining -= len(upload.content)
+            continue
+        with zipfile.ZipFile(open_content(upload.content)) as archive:
+            for member in archive.infolist():
+                name = Path(member.filename).name
+                if member.is_dir() or Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                    continue
+                with archive.open(member) as src:
+                    document = spool_stream(src, name, UPLOAD_SPOOL, max_bytes=max(0, min(MAX_UPLOAD_BYTES, remaining)))
+                documents.append(document)
+                remaining -= len(document.content)
+    return documents
+
+@app.post("/api/structured-ocr/batch", summary="Extract structured data from many documents")
+async def structured_ocr_batch_endpoint(
+    files: List[UploadFile] = File(...),
+    parallelism: int = Query(BATCH_PARALLELISM, ge=1, le=MAX_BATCH_PARALLELISM),
+    mode: OCRMode = Query(OCRMode.LLM, description="ocr_only, local (deterministic parser) or llm"),
+    schema: Optional[str] = Query(None, description="Name of a registered schema for ocr_contents (llm mode)"),
+    api_key: Optional[str] = Depends(get_api_key),
+    cache_mode: str = Depends(get_cache_control)
+):
+    """
+    Process many documents concurrently and stream one NDJSON line per document as it finishes.
+    
+    - **files**: Document files (PDF, JPG, JPEG, PNG) and/or zip archives of them
+    - **parallelism**: (Optional) Maximum number of documents processed at once for this batch
+    - **mode**: (Optional) `llm`, `local` or `ocr_only`, as for `/api/structured-ocr`
+    - **schema**: (Optional) Name of a registered schema, as for `/api/structured-ocr`
+    - **X-API-Key**: (Optional) Mistral API key in header
+    
+    Each line is `{"index", "file_name", "status": "ok", "result"}` or `{"index", "file_name", "status": "error", "error"}`.
+    """
+    response_model = await response_model_for(schema, mode, api_key)
+    # Uploads are closed once the endpoint returns, so spool them all before streaming
+    try:
+        with timed("spool"):
+            uploads = [await read_upload_document(upload) for upload in files]
+            documents = await asyncio.to_thread(expand_batch_uploads, uploads)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid zip archive: {e}")
+    except SpoolLimitError as e:
+        raise HTTPException(status_code=413, detail=f"Decompressed {e}")
+    
+    batch_slots = asyncio.Semaphore(parallelism)
+    
+    async def process_one(index: int, document: Document) -> str:
+        line = {"index": index, "file_name": document.file_name}
+        async with batch_slots:
+            try:
+                payload, cache_status = await cached_structured_ocr(document, api_key, cache_mode, mode=mode, response_model=response_model, schema=schema)
+                line.update(status="ok", cache=cache_status)
+                return embed_json(line, payload, key="result")
+            except HTTPException as e:
+                line.update(status="error", error=e.detail)
+            except RateLimitedError as e:
+                line.update(status="error", error=str(e), retry_after=e.retry_after)
+            except Exception as e:
+                line.update(status="error", error=str(e))
+        return json.dumps(line)
+    
+    async def stream_results():
+        tasks = [asyncio.ensure_future(process_one(i, d)) for i, d in enumerate(documents)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+async def process_job(file_path: str, api_key: Optional[str]) -> str:
+    """Run a queued job through the cached pipeline and return the serialized result"""
+    document = await asyncio.to_thread(map_path, file_path, UPLOAD_SPOOL)
+    payload, _ = await cached_structured_ocr(document, api_key)
+    return payload
+
+def job_owner(api_key: Optional[str]) -> str:
+    """Account a job belongs to, as for stored documents; keyless jobs share "" and rely on their unguessable ID"""
+    return stored_account(api_key) or ""
+
+def job_status(job: dict) -> JobStatus:
+    return JobStatus(
+        job_id=job["id"],
+        status=job["status"],
+        file_name=job["file_name"],
+        attempts=job["attempts"],
+        progress=job["progress"],
+        error=job["error"],
+        result=StructuredOCR.model_validate_json(job["result"]) if job["result"] else None,
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+    )
+
+@app.post("/api/jobs", response_model=JobStatus, status_code=202, summary="Queue a document for background extraction")
+async def submit_job_endpoint(
+    file: UploadFile = File(...),
+    api_key: Optional[str] = Depends(get_api_key)
+):
+    """
+    Queue a document for structured OCR and return its job ID immediately.
+    
+    - **file**: The document file (PDF, JPG, JPEG, or PNG)
+    - **X-API-Key**: (Optional) Mistral API key in header
+    
+    Poll `GET /api/jobs/{job_id}` for progress and the final result.
+    """
+    if Path(file.filename).suffix.lower() not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unsupported file format: {Path(file.filename).suffix}")
+    if not (api_key or os.environ.get("MISTRAL_API_KEY")):
+        raise HTTPException(status_code=401, detail="Mistral API key not provided")
+    
+    try:
+        document = await read_upload_document(file)
+        job_id = await asyncio.to_thread(job_queue.submit, job_owner(api_key), document.file_name, document.content, api_key)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    
+    if job_workers is not None:
+        job_workers.notify()
+    return job_status(await asyncio.to_thread(job_queue.get, job_owner(api_key), job_id))
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatus, summary="Get the status and result of a job")
+async def get_job_endpoint(job_id: str, api_key: Optional[str] = Depends(get_api_key)):
+    """Return a job's status, progress and, once it has succeeded, its structured result, to the X-API-Key that submitted it"""
+    job = await asyncio.to_thread(job_queue.get, job_owner(api_key), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+def require_schema_registry():
+    if schema_registry is None:
+        raise HTTPException(status_code=404, detail="The schema registry is disabled")
+    return schema_registry
+
+@app.put("/api/schemas/{name}", summary="Register a JSON schema for ocr_contents")
+async def register_schema_endpoint(name: str, schema: Dict[str, Any] = Body(...), registry = Depends(require_schema_registry), account: str = Depends(require_account)):
+    """
+    Register (or replace) a JSON object schema under a name, for use as `?schema=name` on the extraction endpoints.
+    
+    Schemas belong to the caller's `X-API-Key`; extraction requests resolve names among the schemas of the key
+    they run under (the server's `MISTRAL_API_KEY` when they send none).
+    
+    Supports `properties`, `required`, `description`, `enum`, `anyOf`/`oneOf`, nullable types, arrays, nested
+    objects and local `$ref`s to `$defs`. The schema is compiled once and reused by every request that names it.
+    """
+    try:
+        compiled = await asyncio.to_thread(registry.register, account, name, schema)
+    except SchemaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"name": compiled.name, "fingerprint": compiled.fingerprint, "json_schema": compiled.model.model_json_schema()}
+
+@app.get("/api/schemas", summary="List registered schemas")
+async def list_schemas_endpoint(registry = Depends(require_schema_registry), account: str = Depends(require_account)):
+    """Return the name, fingerprint and last update time of every schema the caller registered"""
+    return await asyncio.to_thread(registry.names, account)
+
+@app.get("/api/schemas/{name}", summary="Get a registered schema")
+async def get_schema_endpoint(name: str, registry = Depends(require_schema_registry), account: str = Depends(require_account)):
+    """Return one of the caller's schemas as it was registered"""
+    schema = await asyncio.to_thread(registry.schema, account, name)
+    if schema is None:
+        raise HTTPException(status_code=404, detail=f"Unknown schema: {name}")
+    return schema
+
+@app.delete("/api/schemas/{name}", status_code=204, summary="Delete a registered schema")
+async def delete_schema_endpoint(name: str, registry = Depends(require_schema_registry), account: str = Depends(require_account)):
+    """Remove one of the caller's schemas; requests that name it then fail with 404"""
+    if not await asyncio.to_thread(registry.delete, account, name):
+        raise HTTPException(status_code=404, detail=f"Unknown schema: {name}")
+    return Response(status_code=204)
+
+def require_document_store():
+    if document_store is None:
+        raise HTTPException(status_code=404, detail="The document store is disabled")
+    return document_store
+
+@app.get("/api/documents", summary="Search processed documents")
+async def search_documents_endpoint(
+    q: Optional[str] = Query(None, description="Words that must all appear in the markdown, fields, topics or file name; end a word with * for a prefix"),
+    since: Optional[float] = Query(None, description="Only documents processed at or after this Unix time"),
+    until: Optional[float] = Query(None, description="Only documents processed before this Unix time"),
+    limit: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    store = Depends(require_document_store),
+    account: str = Depends(require_account)
+):
+    """
+    Search the results stored for the caller's `X-API-Key` through the full-text index, best matches first;
+    without `q`, list the newest.
+    
+    Returns `{"total", "limit", "offset", "items"}`; each item has the document `id`, `file_name`, `sha256`, `mode`,
+    `schema`, `created_at` and, for searches, a `snippet` with matches in `[brackets]`.
+    """
+    return await asyncio.to_thread(store.search, account, q, limit, offset, since, until)
+
+@app.get("/api/documents/{doc_id}", summary="Get a processed document")
+async def get_document_endpoint(doc_id: int, store = Depends(require_document_store), account: str = Depends(require_account)):
+    """Return one of the caller's stored documents with its full result"""
+    document = await asyncio.to_thread(store.get, account, doc_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    result = document.pop("result")
+    document["created_at"] = document.pop("created")
+    return Response(content=embed_json(document, result, key="result"), media_type="application/json")
+
+@app.delete("/api/documents/{doc_id}", status_code=204, summary="Delete a processed document")
+async def delete_document_endpoint(doc_id: int, store = Depends(require_document_store), account: str = Depends(require_account)):
+    """Remove one of the caller's stored documents and its index entry"""
+    if not await asyncio.to_thread(store.delete, account, doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return Response(status_code=204)
+
+@app.get("/api/cache/stats", summary="Result cache counters")
+async def cache_stats():
+    """Return hit, miss and eviction counters for the result cache, request coalescing and uploaded-file reuse"""
+    coalescing = single_flight.stats if single_flight is not None else None
+    files = file_registry.stats if file_registry is not None else None
+    if result_cache is None:
+        return {"enabled": False, "single_flight": coalescing, "files": files}
+    snapshot = await asyncio.to_thread(result_cache.snapshot)
+    return {"enabled": True, **snapshot, "single_flight": coalescing, "files": files}
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus metrics")
+async def metrics():
+    """Stage durations, payload sizes, page counts, in-flight gauges and error counters in Prometheus format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health", response_model=HealthResponse, summary="Health check endpoint")
 async def health_check():
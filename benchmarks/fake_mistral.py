@@ -0,0 +1,187 @@
+"""Local stand-in for the Mistral OCR, files and chat endpoints
+
+Serves just enough of the API for the OCR pipeline, with injectable latency and
+errors, so the service can be exercised without spending API credits:
+
+    python benchmarks/fake_mistral.py --port 8900 --max-rps 20 --error-429-rate 0.05
+    MISTRAL_SERVER_URL=http://127.0.0.1:8900 MISTRAL_API_KEY=fake uvicorn app:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Mistral API")
+settings = argparse.Namespace(
+    latency_ms=50.0,
+    latency_dist="lognormal",
+    latency_sigma=0.5,
+    ocr_latency_ms=None,
+    chat_latency_ms=None,
+    max_rps=0.0,
+    error_429_rate=0.0,
+    error_500_rate=0.0,
+    retry_after=1.0,
+    pages=1,
+    markdown_chars=2000,
+)
+stats = {"requests": 0, "throttled": 0, "errors": 0}
+_recent: deque = deque()
+
+
+def _latency(median_ms: float) -> float:
+    """Sample a latency in seconds from the configured distribution around median_ms"""
+    if settings.latency_dist == "fixed":
+        return median_ms / 1000.0
+    if settings.latency_dist == "uniform":
+        return random.uniform(0, 2 * median_ms) / 1000.0
+    # Log-normal: median_ms is the median, sigma controls the tail
+    return random.lognormvariate(0, settings.latency_sigma) * median_ms / 1000.0
+
+
+async def _simulate(request: Request, median_ms: Optional[float] = None):
+    """Apply latency and injected failures; returns an error response or None"""
+    stats["requests"] += 1
+    now = time.monotonic()
+    _recent.append(now)
+    while _recent and now - _recent[0] > 1.0:
+        _recent.popleft()
+
+    if (settings.max_rps and len(_recent) > settings.max_rps) or random.random() < settings.error_429_rate:
+        stats["throttled"] += 1
+        return JSONResponse(
+            {"object": "error", "message": "Requests rate limit exceeded", "type": "rate_limited", "code": "1300"},
+            status_code=429,
+            headers={"Retry-After": str(settings.retry_after)},
+        )
+    if random.random() < settings.error_500_rate:
+        stats["errors"] += 1
+        return JSONResponse({"object": "error", "message": "Internal error"}, status_code=500)
+
+    await asyncio.sleep(_latency(median_ms if median_ms is not None else settings.latency_ms))
+    return None
+
+
+def _markdown(page: int) -> str:
+    line = f"Item {page}-{{n}}: Widget | Qty: {{n}} | Total: ${{n}}.00\n"
+    body = f"# Page {page + 1}\n\nInvoice Number: INV-{page:04d}\n\n"
+    n = 0
+    while len(body) < settings.markdown_chars:
+        body += line.format(n=n)
+        n += 1
+    return body
+
+
+@app.post("/v1/ocr")
+async def ocr(request: Request):
+    error = await _simulate(request, settings.ocr_latency_ms)
+    if error:
+        return error
+    body = await request.json()
+    pages = settings.pages if body.get("document", {}).get("type") == "document_url" else 1
+    return {
+        "model": body.get("model", "mistral-ocr-latest"),
+        "pages": [
+            {"index": i, "markdown": _markdown(i), "images": [], "dimensions": {"dpi": 200, "height": 2200, "width": 1700}}
+            for i in range(pages)
+        ],
+        "usage_info": {"pages_processed": pages, "doc_size_bytes": int(request.headers.get("content-length", 0))},
+    }
+
+
+@app.post("/v1/files")
+async def upload_file(request: Request):
+    error = await _simulate(request)
+    if error:
+        return error
+    form = await request.form()
+    upload = form["file"]
+    content = await upload.read()
+    return {
+        "id": str(uuid.uuid4()),
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": upload.filename or "upload.pdf",
+        "purpose": "ocr",
+        "sample_type": "ocr_input",
+        "source": "upload",
+    }
+
+
+@app.get("/v1/files/{file_id}/url")
+async def signed_url(file_id: str, request: Request):
+    error = await _simulate(request)
+    if error:
+        return error
+    return {"url": f"https://fake-mistral.local/files/{file_id}"}
+
+
+@app.delete("/v1/files/{file_id}")
+async def delete_file(file_id: str, request: Request):
+    error = await _simulate(request)
+    if error:
+        return error
+    return {"id": file_id, "object": "file", "deleted": True}
+
+
+@app.post("/v1/chat/completions")
+async def chat(request: Request):
+    error = await _simulate(request, settings.chat_latency_ms)
+    if error:
+        return error
+    body = await request.json()
+    content = {
+        "file_name": "document",
+        "topics": ["Invoice"],
+        "languages": ["English"],
+        "ocr_contents": {"invoice_number": "INV-0000", "total": 42.0},
+        "raw_markdown": "",
+    }
+    return {
+        "id": str(uuid.uuid4()),
+        "object": "chat.completion",
+        "model": body.get("model", "fake"),
+        "created": int(time.time()),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content)}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=settings.latency_ms, help="Median latency of every call")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default=settings.latency_dist)
+    parser.add_argument("--latency-sigma", type=float, default=settings.latency_sigma, help="Log-normal tail width")
+    parser.add_argument("--ocr-latency-ms", type=float, help="Median latency of OCR calls (default --latency-ms)")
+    parser.add_argument("--chat-latency-ms", type=float, help="Median latency of chat calls (default --latency-ms)")
+    parser.add_argument("--max-rps", type=float, default=settings.max_rps, help="Answer 429 above this request rate")
+    parser.add_argument("--error-429-rate", type=float, default=settings.error_429_rate)
+    parser.add_argument("--error-500-rate", type=float, default=settings.error_500_rate)
+    parser.add_argument("--retry-after", type=float, default=settings.retry_after)
+    parser.add_argument("--pages", type=int, default=settings.pages, help="Pages returned for each PDF")
+    parser.add_argument("--markdown-chars", type=int, default=settings.markdown_chars, help="Markdown size per page")
+    args = parser.parse_args()
+    for name in vars(settings):
+        setattr(settings, name, getattr(args, name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
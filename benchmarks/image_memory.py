@@ -0,0 +1,110 @@
+"""Peak memory of the image path: per-stage re-reads and re-encodes vs. a shared Document
+
+Runs the image pipeline against an in-process stand-in for the Mistral client so no
+API calls are made, and reports the tracemalloc peak for both variants.
+
+    python benchmarks/image_memory.py --size-mb 25
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app  # noqa: E402
+from document import Document  # noqa: E402
+
+
+# What the chat model returns; raw_markdown is replaced by the OCR text afterwards
+_PARSED = {"file_name": "scan", "topics": [], "languages": ["English"], "ocr_contents": {}, "raw_markdown": ""}
+
+
+class _OCRResponse:
+    def model_dump_json(self):
+        return json.dumps({"pages": [{"index": 0, "markdown": "# Scan"}]})
+
+
+class _FakeClient:
+    """Holds on to request payloads for the duration of a call, like a real HTTP client would"""
+
+    def __init__(self):
+        self.ocr = types.SimpleNamespace(process=self._ocr)
+        self.chat = types.SimpleNamespace(parse=self._parse)
+
+    def _ocr(self, document, model, **kwargs):
+        body = json.dumps({"document": {"image_url": document.image_url}})
+        del body
+        return _OCRResponse()
+
+    def _parse(self, model, messages, response_format, temperature):
+        body = json.dumps({"image_url": messages[0]["content"][0].image_url})
+        del body
+        # Like the SDK, chat.parse returns an instance of the requested response format
+        message = types.SimpleNamespace(parsed=response_format.model_validate(_PARSED))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def legacy_pipeline(upload: bytes, client: _FakeClient) -> None:
+    """Baseline behaviour: write the upload to disk, then read and encode it once per stage"""
+    temp_dir = tempfile.mkdtemp()
+    file_path = os.path.join(temp_dir, "scan.png")
+    try:
+        with open(file_path, "wb") as f:
+            f.write(upload)
+
+        encoded = base64.b64encode(Path(file_path).read_bytes()).decode()
+        ocr_url = f"data:image/jpeg;base64,{encoded}"
+        client.ocr.process(document=types.SimpleNamespace(image_url=ocr_url), model=app.OCR_MODEL)
+
+        encoded = base64.b64encode(Path(file_path).read_bytes()).decode()
+        chat_url = f"data:image/jpeg;base64,{encoded}"
+        client.chat.parse(
+            model=app.IMAGE_CHAT_MODEL,
+            messages=[{"role": "user", "content": [types.SimpleNamespace(image_url=chat_url)]}],
+            response_format=app.StructuredOCR,
+            temperature=0,
+        )
+    finally:
+        os.remove(file_path)
+        os.rmdir(temp_dir)
+
+
+def shared_document_pipeline(upload: bytes, client: _FakeClient) -> None:
+    app.get_mistral_client = lambda api_key=None: client
+    app.structured_ocr(Document(file_name="scan.png", content=upload))
+
+
+def measure(fn, upload: bytes) -> int:
+    client = _FakeClient()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn(upload, client)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=25.0, help="Size of the synthetic upload")
+    args = parser.parse_args()
+
+    upload = os.urandom(int(args.size_mb * 1024 * 1024))
+    size_mb = len(upload) / 2**20
+    legacy = measure(legacy_pipeline, upload) / 2**20
+    shared = measure(shared_document_pipeline, upload) / 2**20
+
+    print(f"upload size:        {size_mb:8.1f} MiB")
+    print(f"legacy peak:        {legacy:8.1f} MiB ({legacy / size_mb:.1f}x upload)")
+    print(f"shared Document:    {shared:8.1f} MiB ({shared / size_mb:.1f}x upload)")
+    print(f"reduction:          {legacy - shared:8.1f} MiB ({(1 - shared / legacy) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Payload size and time of the image pre-processing stage over a set of fixtures
+
+Without --fixtures a synthetic 4000x3000 text scan is generated. With --ocr each
+fixture is also sent to Mistral OCR before and after pre-processing (needs
+MISTRAL_API_KEY) to check that the extracted text is unchanged.
+
+    python benchmarks/image_preprocess.py --fixtures path/to/images --ocr
+"""
+import argparse
+import difflib
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from document import Document  # noqa: E402
+from image_preprocess import config_from_env, preprocess_image  # noqa: E402
+
+
+def synthetic_scan() -> Document:
+    """A phone-camera sized page of text with some sensor noise"""
+    rng = random.Random(0)
+    image = Image.new("RGB", (4000, 3000), "white")
+    draw = ImageDraw.Draw(image)
+    for _ in range(20000):
+        x, y = rng.randrange(4000), rng.randrange(3000)
+        draw.point((x, y), fill=(rng.randrange(200, 256),) * 3)
+    for line in range(60):
+        draw.text((200, 150 + line * 45), f"Line item {line:03d}    Qty {line % 7 + 1}    Total ${line * 13.37:,.2f}", fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return Document(file_name="synthetic_scan.png", content=buffer.getvalue())
+
+
+def load_fixtures(directory: str) -> list:
+    return [
+        Document.from_path(path)
+        for path in sorted(Path(directory).iterdir())
+        if path.suffix.lower() in (".jpg", ".jpeg", ".png")
+    ]
+
+
+def ocr_markdown(document: Document) -> tuple[str, float]:
+    import app
+
+    start = time.perf_counter()
+    result = app.process_image_ocr(document)
+    return "\n\n".join(page["markdown"] for page in result["pages"]), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="Directory of .jpg/.png fixtures")
+    parser.add_argument("--ocr", action="store_true", help="Compare OCR output before and after (uses the API)")
+    args = parser.parse_args()
+
+    config = config_from_env()
+    documents = load_fixtures(args.fixtures) if args.fixtures else [synthetic_scan()]
+    print(f"config: {config.fingerprint}")
+
+    total_in = total_out = 0
+    for document in documents:
+        start = time.perf_counter()
+        processed, stats = preprocess_image(document, config)
+        elapsed = time.perf_counter() - start
+        total_in += stats.original_bytes
+        total_out += stats.output_bytes
+        print(
+            f"{document.file_name}: {stats.original_size} -> {stats.output_size}, "
+            f"{stats.original_bytes / 1024:.0f} KiB -> {stats.output_bytes / 1024:.0f} KiB "
+            f"({stats.bytes_saved / max(stats.original_bytes, 1):.0%} saved) in {elapsed * 1000:.0f} ms"
+        )
+        if args.ocr:
+            before, before_time = ocr_markdown(document)
+            after, after_time = ocr_markdown(processed)
+            similarity = difflib.SequenceMatcher(None, before, after).ratio()
+            print(f"    OCR {before_time:.2f}s -> {after_time:.2f}s, text similarity {similarity:.3f}")
+
+    print(f"total: {total_in / 2**20:.1f} MiB -> {total_out / 2**20:.1f} MiB ({1 - total_out / max(total_in, 1):.0%} saved)")
+
+
+if __name__ == "__main__":
+    main()
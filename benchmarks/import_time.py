@@ -0,0 +1,77 @@
+"""Cold-start import time of the API module, as a worker startup regression guard
+
+Imports `app` in fresh interpreters with `-X importtime`, reports the median wall time
+and the slowest top-level imports, and exits non-zero when --max-ms is exceeded.
+
+    python benchmarks/import_time.py --runs 5 --max-ms 1500 --json import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_once(module: str) -> tuple[float, dict]:
+    """Import module in a new interpreter; return wall time in ms and cumulative µs per direct import"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    # importtime lists children before their parent, indented two spaces per level
+    top_level, pending = {}, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        if level == 1:
+            pending[name.strip()] = int(cumulative)
+        elif level == 0:
+            if name.strip() == module:
+                top_level = pending
+            pending = {}
+    return float(proc.stdout.strip().splitlines()[-1]), top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="Fail if the median import time exceeds this")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    timings, breakdown = [], {}
+    for _ in range(args.runs):
+        elapsed, top_level = import_once(args.module)
+        timings.append(elapsed)
+        for name, micros in top_level.items():
+            breakdown.setdefault(name, []).append(micros)
+
+    median = statistics.median(timings)
+    slowest = sorted(((statistics.median(v) / 1000, k) for k, v in breakdown.items()), reverse=True)[:10]
+    print(f"import {args.module}: median {median:.0f} ms over {args.runs} runs (min {min(timings):.0f}, max {max(timings):.0f})")
+    for millis, name in slowest:
+        print(f"  {millis:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"module": args.module, "runs": timings, "median_ms": median,
+                       "slowest": [{"module": name, "ms": millis} for millis, name in slowest]}, f, indent=2)
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL: median import time {median:.0f} ms exceeds {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Load generator for /api/structured-ocr, backed by the local fake Mistral server
+
+By default starts benchmarks/fake_mistral.py and the API (uvicorn app:app) on free
+ports, drives the API at a fixed concurrency with a corpus of image and PDF fixtures,
+and reports latency percentiles, throughput, the API's peak RSS and event-loop lag
+(measured as /health latency while under load). Results are written as JSON so runs
+can be compared across commits.
+
+    python benchmarks/load_test.py --concurrency 32 --requests 500 --output results.json
+    python benchmarks/load_test.py --fake-args "--latency-ms 800 --max-rps 50"
+    python benchmarks/load_test.py --target http://localhost:8000 --fixtures path/to/docs
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import shlex
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def synthetic_corpus() -> List[tuple[str, bytes]]:
+    """One small scan-like PNG and one three-page PDF"""
+    from PIL import Image, ImageDraw
+    from pypdf import PdfWriter
+
+    image = Image.new("RGB", (1700, 2200), "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(40):
+        draw.text((100, 100 + line * 50), f"Item {line:02d}  Qty {line % 5 + 1}  Total ${line * 9.5:.2f}", fill="black")
+    png = io.BytesIO()
+    image.save(png, format="PNG")
+
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(612, 792)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    return [("scan.png", png.getvalue()), ("report.pdf", pdf.getvalue())]
+
+
+def load_corpus(directory: str) -> List[tuple[str, bytes]]:
+    return [
+        (path.name, path.read_bytes())
+        for path in sorted(Path(directory).iterdir())
+        if path.suffix.lower() in (".pdf", ".jpg", ".jpeg", ".png")
+    ]
+
+
+def peak_rss_bytes(pid: int) -> Optional[int]:
+    """High-water resident set size of a process (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+async def run_load(target: str, corpus: List[tuple[str, bytes]], concurrency: int, total: int, use_cache: bool) -> dict:
+    latencies: List[float] = []
+    statuses: dict = {}
+    # X-Cache of every successful response; COALESCED ones waited on another request's run
+    cache: dict = {}
+    lag_samples: List[float] = []
+    issued = 0
+    headers = {} if use_cache else {"X-Cache-Control": "bypass"}
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=target, timeout=600, limits=limits) as client:
+
+        async def worker() -> None:
+            nonlocal issued
+            while issued < total:
+                name, content = corpus[issued % len(corpus)]
+                issued += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/structured-ocr", files={"file": (name, content)}, headers=headers)
+                    status = response.status_code
+                    if status == 200:
+                        outcome = response.headers.get("X-Cache", "none")
+                        cache[outcome] = cache.get(outcome, 0) + 1
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - start)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        async def probe_lag(stop: asyncio.Event) -> None:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    await client.get("/health")
+                    lag_samples.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_lag(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    ok = statuses.get("200", 0)
+    return {
+        "requests": len(latencies),
+        "statuses": statuses,
+        "cache": cache,
+        "elapsed_s": elapsed,
+        "docs_per_s": ok / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000 if latencies else None,
+            "p95": percentile(latencies, 95) * 1000 if latencies else None,
+            "p99": percentile(latencies, 99) * 1000 if latencies else None,
+            "mean": statistics.mean(latencies) * 1000 if latencies else None,
+            "max": max(latencies) * 1000 if latencies else None,
+        },
+        "event_loop_lag_ms": {
+            "p50": percentile(lag_samples, 50) * 1000 if lag_samples else None,
+            "p99": percentile(lag_samples, 99) * 1000 if lag_samples else None,
+            "max": max(lag_samples) * 1000 if lag_samples else None,
+        },
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", help="Existing API base URL; by default the API and fake server are started")
+    parser.add_argument("--fixtures", help="Directory of .pdf/.jpg/.png documents (default: synthetic corpus)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--use-cache", action="store_true", help="Let the result cache serve repeated documents")
+    parser.add_argument("--fake-args", default="", help="Extra arguments for fake_mistral.py")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.fixtures) if args.fixtures else synthetic_corpus()
+    processes = []
+    api_pid = None
+    scratch = None
+    target = args.target
+    try:
+        if target is None:
+            fake_port, api_port = free_port(), free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, str(ROOT / "benchmarks" / "fake_mistral.py"), "--port", str(fake_port)]
+                + shlex.split(args.fake_args),
+                cwd=ROOT,
+            ))
+            scratch = tempfile.mkdtemp(prefix="ocr-load-")
+            env = dict(
+                os.environ,
+                MISTRAL_SERVER_URL=f"http://127.0.0.1:{fake_port}",
+                MISTRAL_API_KEY="fake",
+                # Keep every store the API writes out of the working tree's .cache
+                OCR_CACHE_PATH=os.path.join(scratch, "cache.sqlite3"),
+                OCR_JOBS_DIR=os.path.join(scratch, "jobs"),
+                OCR_DOCUMENT_STORE_PATH=os.path.join(scratch, "documents.sqlite3"),
+                OCR_SCHEMA_REGISTRY_PATH=os.path.join(scratch, "schemas.sqlite3"),
+                OCR_FILE_REGISTRY_PATH=os.path.join(scratch, "mistral_files.sqlite3"),
+                OCR_SPOOL_DIR=os.path.join(scratch, "spool"),
+                # The corpus is a handful of documents; shared runs would measure waiting, not the pipeline
+                OCR_SINGLE_FLIGHT_ENABLED="false",
+            )
+            api = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app:app", "--port", str(api_port), "--log-level", "warning"],
+                cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+            )
+            processes.append(api)
+            api_pid = api.pid
+            target = f"http://127.0.0.1:{api_port}"
+            asyncio.run(wait_ready(f"http://127.0.0.1:{fake_port}/stats"))
+        asyncio.run(wait_ready(f"{target}/health"))
+
+        results = asyncio.run(run_load(target, corpus, args.concurrency, args.requests, args.use_cache))
+        results["peak_rss_bytes"] = peak_rss_bytes(api_pid) if api_pid else None
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "corpus": [name for name, _ in corpus],
+            "fake_args": args.fake_args,
+            "target": args.target or "local",
+        },
+        "results": results,
+    }
+
+    latency = results["latency_ms"]
+    lag = results["event_loop_lag_ms"]
+    print(f"{results['requests']} requests in {results['elapsed_s']:.1f}s -> {results['docs_per_s']:.1f} docs/s  statuses {results['statuses']}  cache {results['cache']}")
+    if latency["p50"] is not None:
+        print(f"latency p50 {latency['p50']:.0f} ms  p95 {latency['p95']:.0f} ms  p99 {latency['p99']:.0f} ms")
+    if lag["p50"] is not None:
+        print(f"/health under load p50 {lag['p50']:.1f} ms  p99 {lag['p99']:.1f} ms  max {lag['max']:.1f} ms")
+    if results["peak_rss_bytes"]:
+        print(f"API peak RSS {results['peak_rss_bytes'] / 2**20:.0f} MiB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.output}")
+    coalesced = results["cache"].get("COALESCED", 0)
+    if coalesced and not args.use_cache:
+        sys.exit(f"{coalesced} requests were coalesced onto other requests' runs; the figures above do not measure the pipeline")
+
+
+if __name__ == "__main__":
+    main()
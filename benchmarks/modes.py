@@ -0,0 +1,107 @@
+"""Latency of the ocr_only, local and llm structuring modes
+
+Runs each fixture through structured_ocr_async in every mode and reports the median and
+p95 latency per mode, plus the time spent in the local markdown parser. By default the
+Mistral calls go to benchmarks/fake_mistral.py with OCR and chat latencies resembling the
+real service; with --live they go to Mistral (needs MISTRAL_API_KEY).
+
+    python benchmarks/modes.py --runs 20
+    python benchmarks/modes.py --fake-args "--ocr-latency-ms 2000 --chat-latency-ms 4000"
+    python benchmarks/modes.py --live --fixtures path/to/docs --runs 3
+"""
+import argparse
+import asyncio
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from load_test import free_port, load_corpus, percentile, synthetic_corpus, wait_ready  # noqa: E402
+
+MODES = ("ocr_only", "local", "llm")
+
+
+async def run(documents, runs: int) -> dict:
+    import app
+    from markdown_parser import parse_markdown
+
+    timings = {mode: [] for mode in MODES}
+    parse_times = []
+    for _ in range(runs):
+        for document in documents:
+            for mode in MODES:
+                start = time.perf_counter()
+                result = await app.structured_ocr_async(document, mode=app.OCRMode(mode))
+                timings[mode].append(time.perf_counter() - start)
+                if mode == "local":
+                    start = time.perf_counter()
+                    parse_markdown(result.raw_markdown)
+                    parse_times.append(time.perf_counter() - start)
+    await app.client_pool.aclose()
+    return {"modes": timings, "local_parse": parse_times}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", help="Directory of .pdf/.jpg/.png documents (default: synthetic corpus)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--live", action="store_true", help="Call the real Mistral API instead of the fake server")
+    parser.add_argument(
+        "--fake-args",
+        default="--ocr-latency-ms 1500 --chat-latency-ms 2500 --markdown-chars 4000",
+        help="Arguments for fake_mistral.py",
+    )
+    args = parser.parse_args()
+
+    from document import Document
+
+    documents = [
+        Document(file_name=name, content=content)
+        for name, content in (load_corpus(args.fixtures) if args.fixtures else synthetic_corpus())
+    ]
+    scratch = tempfile.mkdtemp(prefix="ocr-modes-")
+    os.environ.update(OCR_CACHE_ENABLED="false", OCR_JOBS_DIR=os.path.join(scratch, "jobs"))
+
+    fake = None
+    if not args.live:
+        port = free_port()
+        fake = subprocess.Popen(
+            [sys.executable, str(ROOT / "benchmarks" / "fake_mistral.py"), "--port", str(port)]
+            + shlex.split(args.fake_args)
+        )
+        os.environ.update(
+            MISTRAL_SERVER_URL=f"http://127.0.0.1:{port}",
+            MISTRAL_API_KEY="fake",
+            MISTRAL_RATE_REQUESTS_PER_SECOND="0",
+        )
+    try:
+        if fake is not None:
+            asyncio.run(wait_ready(f"{os.environ['MISTRAL_SERVER_URL']}/stats"))
+        results = asyncio.run(run(documents, args.runs))
+    finally:
+        if fake is not None:
+            fake.terminate()
+            fake.wait(timeout=10)
+
+    print(f"{len(documents)} documents x {args.runs} runs ({'live' if args.live else 'fake server'})")
+    baseline = statistics.median(results["modes"]["llm"])
+    for mode in MODES:
+        samples = results["modes"][mode]
+        median = statistics.median(samples)
+        print(
+            f"{mode:>9}: median {median * 1000:7.0f} ms  p95 {percentile(samples, 95) * 1000:7.0f} ms  "
+            f"({median / baseline:.0%} of llm)"
+        )
+    parse = results["local_parse"]
+    print(f"local parser: median {statistics.median(parse) * 1000:.2f} ms, max {max(parse) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
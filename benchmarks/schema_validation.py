@@ -0,0 +1,155 @@
+"""Per-request CPU of validating and serialising structured results
+
+Compares the previous result path with the current one, in microseconds per request:
+
+- before: chat.parse rebuilt the response format on every call and validated the reply;
+  raw_markdown was attached by a dump/load/validate round trip; the result was dumped
+  for the cache; FastAPI validated and serialised it again for the response.
+- after: the response format is built once per model, the reply is validated once
+  from its JSON text, raw_markdown is attached with model_copy, the result is
+  serialised once, and that JSON is both cached and returned.
+
+Cache hits and schema compilation are measured the same way. No network calls are made.
+
+    python benchmarks/schema_validation.py --iterations 2000 --markdown-chars 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Schemas are registered per API key fingerprint
+ACCOUNT = "benchmark"
+
+INVOICE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "invoice_number": {"type": "string"},
+        "issue_date": {"type": ["string", "null"]},
+        "currency": {"enum": ["EUR", "USD", "GBP"]},
+        "total": {"type": "number"},
+        "lines": {"type": "array", "items": {"$ref": "#/$defs/line"}},
+    },
+    "required": ["invoice_number", "total", "lines"],
+    "$defs": {
+        "line": {
+            "type": "object",
+            "properties": {"description": {"type": "string"}, "quantity": {"type": "integer"}, "amount": {"type": "number"}},
+            "required": ["description", "amount"],
+        }
+    },
+}
+
+
+def chat_reply(markdown_chars: int) -> tuple[str, str]:
+    contents = {
+        "invoice_number": "INV-2024-0042",
+        "issue_date": "2024-03-01",
+        "currency": "EUR",
+        "total": 1234.5,
+        "lines": [{"description": f"Item {i}", "quantity": i, "amount": 10.0 * i} for i in range(40)],
+    }
+    return json.dumps({
+        "file_name": "invoice",
+        "topics": ["Invoice", "Billing"],
+        "languages": ["English"],
+        "ocr_contents": contents,
+        # The chat model echoes a short raw_markdown that is replaced by the real OCR text
+        "raw_markdown": "",
+    }), "x" * markdown_chars
+
+
+def measure(fn, iterations: int) -> float:
+    """Median microseconds per call over five rounds"""
+    rounds = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        rounds.append((time.perf_counter() - start) / iterations * 1e6)
+    return statistics.median(rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--markdown-chars", type=int, default=20000, help="Size of raw_markdown in each result")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="ocr-schemas-")
+    os.environ.update(
+        OCR_CACHE_ENABLED="false",
+        OCR_JOBS_DIR=os.path.join(scratch, "jobs"),
+        OCR_SCHEMA_REGISTRY_PATH=os.path.join(scratch, "schemas.sqlite3"),
+        MISTRAL_API_KEY=os.environ.get("MISTRAL_API_KEY", "benchmark"),
+    )
+    import app
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from mistralai.extra.utils.response_format import response_format_from_pydantic_model
+    from schema_registry import compile_schema, response_format_for
+
+    route = next(r for r in app.app.routes if getattr(r, "path", None) == "/api/structured-ocr")
+    app.schema_registry.register(ACCOUNT, "invoice", INVOICE_SCHEMA)
+    reply, raw_markdown = chat_reply(args.markdown_chars)
+    loop = asyncio.new_event_loop()
+
+    # The route's StructuredOCR response field warns when it serialises a schema variant's typed ocr_contents
+    warnings.filterwarnings("ignore", message="Pydantic serializer warnings")
+
+    def fastapi_response(result) -> bytes:
+        content = loop.run_until_complete(serialize_response(field=route.response_field, response_content=result))
+        return JSONResponse(content).body
+
+    def before_miss(model):
+        response_format_from_pydantic_model(model)
+        parsed = model.model_validate(json.loads(reply))
+        parsed_dict = json.loads(parsed.model_dump_json())
+        parsed_dict["raw_markdown"] = raw_markdown
+        result = model.model_validate(parsed_dict)
+        result.model_dump_json()
+        fastapi_response(result)
+
+    def after_miss(model):
+        response_format_for(model)
+        parsed = model.model_validate_json(reply)
+        parsed.model_copy(update={"raw_markdown": raw_markdown}).model_dump_json()
+
+    cached = app.StructuredOCR.model_validate_json(reply).model_copy(update={"raw_markdown": raw_markdown}).model_dump_json()
+
+    def before_hit():
+        fastapi_response(app.StructuredOCR.model_validate_json(cached))
+
+    def after_hit():
+        app.Response(content=cached, media_type="application/json")
+
+    invoice_model = app.schema_registry.get(ACCOUNT, "invoice").model
+    rows = [
+        ("miss, StructuredOCR", measure(lambda: before_miss(app.StructuredOCR), args.iterations),
+         measure(lambda: after_miss(app.StructuredOCR), args.iterations)),
+        ("miss, invoice schema", measure(lambda: before_miss(invoice_model), args.iterations),
+         measure(lambda: after_miss(invoice_model), args.iterations)),
+        ("cache hit", measure(before_hit, args.iterations), measure(after_hit, args.iterations)),
+        ("schema lookup", measure(lambda: compile_schema("invoice", INVOICE_SCHEMA, app.StructuredOCR), max(1, args.iterations // 10)),
+         measure(lambda: app.schema_registry.get(ACCOUNT, "invoice"), args.iterations)),
+    ]
+    loop.close()
+
+    print(f"raw_markdown: {args.markdown_chars} chars, {args.iterations} iterations")
+    print(f"{'path':<22}{'before µs':>12}{'after µs':>12}{'saved':>9}")
+    for name, before, after in rows:
+        print(f"{name:<22}{before:12.1f}{after:12.1f}{1 - after / before:9.0%}")
+    print("schema lookup 'before' compiles the schema on every request; 'after' is a registry hit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Set
+
+import httpx
+from mistralai import Mistral
+
+
+class ClientPool:
+    """Bounded pool of Mistral clients keyed by API key, backed by keep-alive HTTP connections
+
+    Evicted clients are closed once they have been out of the pool for the request timeout,
+    so requests still holding them can finish first.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = 64,
+        idle_timeout: float = 600.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 300.0,
+        server_url: Optional[str] = None,
+    ):
+        self.server_url = server_url
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=10.0)
+        self.close_after = timeout
+        self._clients: "OrderedDict[str, tuple[float, Mistral, httpx.Client, httpx.AsyncClient]]" = OrderedDict()
+        # (evicted at, sync client, async client) of evicted clients not closed yet, oldest first
+        self._retired: List[tuple[float, httpx.Client, httpx.AsyncClient]] = []
+        self._closing: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "evicted": 0, "closed": 0}
+
+    def get(self, api_key: str) -> Mistral:
+        """Return a pooled client for api_key, creating one if needed"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            self._close_retired(now)
+            entry = self._clients.get(api_key)
+            if entry is not None:
+                _, client, http_client, async_http_client = entry
+                self._clients[api_key] = (now, client, http_client, async_http_client)
+                self._clients.move_to_end(api_key)
+                self.stats["reused"] += 1
+                return client
+
+            http_client = httpx.Client(follow_redirects=True, limits=self.limits, timeout=self.timeout)
+            async_http_client = httpx.AsyncClient(follow_redirects=True, limits=self.limits, timeout=self.timeout)
+            client = Mistral(
+                api_key=api_key, server_url=self.server_url, client=http_client, async_client=async_http_client
+            )
+            self._clients[api_key] = (now, client, http_client, async_http_client)
+            self.stats["created"] += 1
+
+            while len(self._clients) > self.max_clients:
+                self._retire(now, self._clients.popitem(last=False)[1])
+            return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def aclose(self) -> None:
+        """Close every pooled connection; called on application shutdown"""
+        with self._lock:
+            entries = [(http_client, async_http_client) for _, _, http_client, async_http_client in self._clients.values()]
+            entries += [(http_client, async_http_client) for _, http_client, async_http_client in self._retired]
+            self._clients.clear()
+            self._retired.clear()
+        for http_client, async_http_client in entries:
+            http_client.close()
+            await async_http_client.aclose()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def _retire(self, now: float, entry: tuple[float, Mistral, httpx.Client, httpx.AsyncClient]) -> None:
+        _, _, http_client, async_http_client = entry
+        self._retired.append((now, http_client, async_http_client))
+        self.stats["evicted"] += 1
+
+    def _evict_idle(self, now: float) -> None:
+        for api_key in [k for k, (used, *_) in self._clients.items() if now - used > self.idle_timeout]:
+            self._retire(now, self._clients.pop(api_key))
+
+    def _close_retired(self, now: float) -> None:
+        """Close evicted clients whose grace period is over (callers hold the lock)"""
+        due = 0
+        while due < len(self._retired) and now - self._retired[due][0] >= self.close_after:
+            due += 1
+        if not due:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # The async client can only be closed on the event loop; a later call there, or aclose, does it
+            return
+        for _, http_client, async_http_client in self._retired[:due]:
+            http_client.close()
+            task = loop.create_task(async_http_client.aclose())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            self.stats["closed"] += 1
+        del self._retired[:due]
+
+
+def pool_from_env() -> ClientPool:
+    """Create the client pool configured by MISTRAL_POOL_* environment variables"""
+    return ClientPool(
+        max_clients=int(os.environ.get("MISTRAL_POOL_MAX_CLIENTS", "64")),
+        idle_timeout=float(os.environ.get("MISTRAL_POOL_IDLE_SECONDS", "600")),
+        max_connections=int(os.environ.get("MISTRAL_POOL_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.environ.get("MISTRAL_POOL_MAX_KEEPALIVE", "20")),
+        timeout=float(os.environ.get("MISTRAL_TIMEOUT_SECONDS", "300")),
+        server_url=os.environ.get("MISTRAL_SERVER_URL") or None,
+    )
@@ -0,0 +1,124 @@
+import base64
+import hashlib
+import io
+import mimetypes
+import mmap
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import BinaryIO, Union
+
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp',
+}
+
+
+@dataclass(eq=False)
+class Document:
+    """An uploaded document held in memory once and shared by every pipeline stage
+
+    The hash and base64 data URL are computed on first use and then reused, so the
+    OCR call, the chat call and the result cache never re-read or re-encode the bytes.
+    """
+
+    file_name: str
+    # Large uploads are a read-only memory map of their spool file rather than bytes
+    content: Union[bytes, mmap.mmap]
+
+    @classmethod
+    def from_path(cls, path: Union[str, Path]) -> "Document":
+        path = Path(path)
+        return cls(file_name=path.name, content=path.read_bytes())
+
+    @classmethod
+    def with_sha256(cls, file_name: str, content: Union[bytes, mmap.mmap], sha256: str) -> "Document":
+        """A Document whose hash was already computed while its content was received"""
+        document = cls(file_name=file_name, content=content)
+        document.__dict__["sha256"] = sha256
+        return document
+
+    @property
+    def extension(self) -> str:
+        return Path(self.file_name).suffix.lower()
+
+    @property
+    def stem(self) -> str:
+        return Path(self.file_name).stem
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES.get(self.extension) or mimetypes.guess_type(self.file_name)[0] or 'application/octet-stream'
+
+    @cached_property
+    def sha256(self) -> str:
+        return hashlib.sha256(self.content).hexdigest()
+
+    def as_bytes(self) -> bytes:
+        """The content as bytes, for clients that do not accept a memory map"""
+        return self.content if isinstance(self.content, bytes) else self.content[:]
+
+    @cached_property
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.content).decode('ascii')}"
+
+
+class _MemoryReader(io.RawIOBase):
+    """A seekable file object over a memory map, reading straight from the mapped pages
+
+    Each reader keeps its own position, so several can read one mapping from different threads.
+    """
+
+    def __init__(self, content: mmap.mmap):
+        self._view = memoryview(content)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._position + size)
+        data = self._view[self._position:end].tobytes()
+        self._position = max(self._position, end)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+
+def open_content(content: Union[bytes, mmap.mmap]) -> BinaryIO:
+    """A file object over document content that does not copy it
+
+    BytesIO shares a bytes object's buffer but copies anything else, such as a memory map.
+    """
+    if isinstance(content, bytes):
+        return io.BytesIO(content)
+    return _MemoryReader(content)
+
+
+def as_document(source: Union[str, Path, Document]) -> Document:
+    """Accept either a file path or an already loaded Document"""
+    if isinstance(source, Document):
+        return source
+    return Document.from_path(source)
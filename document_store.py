@@ -0,0 +1,225 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+# Terms of a search query; a trailing * keeps its prefix-match meaning
+_TERM = re.compile(r'[^\s"]+')
+
+# Prune expired and surplus documents once every this many inserts
+PRUNE_EVERY = 100
+
+
+def flatten_fields(value: Any, path: str = "") -> Iterator[str]:
+    """Yield "path: value" lines for every leaf of nested ocr_contents, so field values are searchable"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten_fields(item, f"{path}.{key}" if path else str(key))
+    elif isinstance(value, list):
+        for item in value:
+            yield from flatten_fields(item, path)
+    elif value is not None and value != "":
+        yield f"{path}: {value}" if path else str(value)
+
+
+def match_query(text: str) -> Optional[str]:
+    """Turn free text into an FTS5 query that matches all terms, so user input can never be a syntax error"""
+    terms = []
+    for term in _TERM.findall(text):
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        # Punctuation-only terms have no tokens and would match nothing
+        if any(c.isalnum() for c in term):
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    return " ".join(terms) or None
+
+
+class DocumentStore:
+    """Every processed result, kept in SQLite with an FTS5 index over its markdown and fields
+
+    Every entry belongs to the account (API key fingerprint) that produced it and is only
+    visible to that account. Within an account, results are keyed by their result-cache key,
+    so reprocessing a document with the same settings replaces its entry. Entries older than
+    retention_seconds, and the oldest beyond max_documents, are pruned.
+    """
+
+    def __init__(self, path: str, retention_seconds: float = 90 * 24 * 3600, max_documents: int = 100_000):
+        self.retention_seconds = retention_seconds
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.stats = {"stored": 0, "searches": 0, "pruned": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, account TEXT NOT NULL, key TEXT NOT NULL, sha256 TEXT NOT NULL, "
+            "file_name TEXT NOT NULL, mode TEXT NOT NULL, schema TEXT, created REAL NOT NULL, result TEXT NOT NULL, "
+            "UNIQUE (account, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_created ON documents(created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_account_created ON documents(account, created)")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+            "file_name, topics, fields, markdown, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def add(self, account: str, key: str, sha256: str, file_name: str, mode: str, schema: Optional[str], result_json: str,
+            replace: bool = True) -> int:
+        """Store a serialised result for an account and index it; returns the document ID
+
+        With replace=False (a result served from the cache) an existing entry is kept as it is.
+        """
+        if not replace:
+            with self._lock:
+                existing = self._db.execute(
+                    "SELECT id FROM documents WHERE account = ? AND key = ?", (account, key)
+                ).fetchone()
+            if existing is not None:
+                return existing["id"]
+        result = json.loads(result_json)
+        topics = " ".join(result.get("topics") or [])
+        fields = "\n".join(flatten_fields(result.get("ocr_contents") or {}))
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._db.execute(
+                    "SELECT id FROM documents WHERE account = ? AND key = ?", (account, key)
+                ).fetchone()
+                if previous is not None:
+                    self._db.execute("DELETE FROM documents_fts WHERE rowid = ?", (previous["id"],))
+                    self._db.execute("DELETE FROM documents WHERE id = ?", (previous["id"],))
+                cursor = self._db.execute(
+                    "INSERT INTO documents (account, key, sha256, file_name, mode, schema, created, result) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (account, key, sha256, file_name, mode, schema, now, result_json),
+                )
+                doc_id = cursor.lastrowid
+                self._db.execute(
+                    "INSERT INTO documents_fts (rowid, file_name, topics, fields, markdown) VALUES (?, ?, ?, ?, ?)",
+                    (doc_id, file_name, topics, fields, result.get("raw_markdown") or ""),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self.stats["stored"] += 1
+            self._inserts += 1
+            if self._inserts % PRUNE_EVERY == 0:
+                self._prune(now)
+        return doc_id
+
+    def search(self, account: str, query: Optional[str] = None, limit: int = 20, offset: int = 0,
+               since: Optional[float] = None, until: Optional[float] = None) -> dict:
+        """Page through an account's documents matching query (best matches first), or all of them newest first"""
+        where = ["d.account = ?", "d.created >= ?"]
+        params: List[Any] = [account, time.time() - self.retention_seconds]
+        if since is not None:
+            where.append("d.created >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("d.created < ?")
+            params.append(until)
+        match = match_query(query) if query else None
+        if match is not None:
+            source = "documents_fts f JOIN documents d ON d.id = f.rowid"
+            where.append("documents_fts MATCH ?")
+            params.append(match)
+            columns = "snippet(documents_fts, -1, '[', ']', '…', 12) AS snippet, bm25(documents_fts) AS rank"
+            order = "rank"
+        else:
+            source = "documents d"
+            columns = "NULL AS snippet, NULL AS rank"
+            order = "d.created DESC"
+        condition = " AND ".join(where)
+        with self._lock:
+            self.stats["searches"] += 1
+            (total,) = self._db.execute(f"SELECT COUNT(*) FROM {source} WHERE {condition}", params).fetchone()
+            rows = self._db.execute(
+                f"SELECT d.id, d.file_name, d.sha256, d.mode, d.schema, d.created, {columns} "
+                f"FROM {source} WHERE {condition} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        items = [
+            {
+                "id": row["id"],
+                "file_name": row["file_name"],
+                "sha256": row["sha256"],
+                "mode": row["mode"],
+                "schema": row["schema"],
+                "created_at": row["created"],
+                "snippet": row["snippet"],
+            }
+            for row in rows
+        ]
+        return {"total": total, "limit": limit, "offset": offset, "items": items}
+
+    def get(self, account: str, doc_id: int) -> Optional[dict]:
+        """One of an account's stored documents, with its result still serialised as JSON text"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, file_name, sha256, mode, schema, created, result FROM documents "
+                "WHERE id = ? AND account = ? AND created >= ?",
+                (doc_id, account, time.time() - self.retention_seconds),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def delete(self, account: str, doc_id: int) -> bool:
+        """Delete one of an account's documents; False if the account has no such document"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = self._db.execute(
+                    "DELETE FROM documents WHERE id = ? AND account = ?", (doc_id, account)
+                ).rowcount > 0
+                if deleted:
+                    self._db.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return deleted
+
+    def prune(self) -> int:
+        with self._lock:
+            return self._prune(time.time())
+
+    def _prune(self, now: float) -> int:
+        expired = [row[0] for row in self._db.execute(
+            "SELECT id FROM documents WHERE created < ?", (now - self.retention_seconds,)
+        )]
+        (count,) = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()
+        surplus = count - len(expired) - self.max_documents
+        if surplus > 0:
+            expired += [row[0] for row in self._db.execute(
+                "SELECT id FROM documents WHERE created >= ? ORDER BY created LIMIT ?",
+                (now - self.retention_seconds, surplus),
+            )]
+        for start in range(0, len(expired), 500):
+            batch = expired[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            self._db.execute(f"DELETE FROM documents_fts WHERE rowid IN ({marks})", batch)
+            self._db.execute(f"DELETE FROM documents WHERE id IN ({marks})", batch)
+        self.stats["pruned"] += len(expired)
+        return len(expired)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def store_from_env() -> Optional[DocumentStore]:
+    """Create the document store configured by OCR_DOCUMENT_STORE_* environment variables"""
+    if os.environ.get("OCR_DOCUMENT_STORE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    return DocumentStore(
+        path=os.environ.get("OCR_DOCUMENT_STORE_PATH", os.path.join(".cache", "documents.sqlite3")),
+        retention_seconds=float(os.environ.get("OCR_DOCUMENT_STORE_RETENTION_DAYS", "90")) * 24 * 3600,
+        max_documents=int(os.environ.get("OCR_DOCUMENT_STORE_MAX_DOCUMENTS", "100000")),
+    )
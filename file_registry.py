@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Files belong to an account, so entries are scoped by a hash of the API key (never the key itself)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class FileRegistry:
+    """Maps uploaded document hashes to their Mistral file ID and signed URL
+
+    A hot PDF is uploaded once per API key; later requests reuse the file and, until it
+    is close to expiry, its signed URL. Entries unused for ttl_seconds are stale and
+    their remote files are deleted by the sweeper. Deleting needs the API key, which is
+    only ever held in memory, so entries of keys no running process has seen are dropped
+    without deleting their files once they have been stale for a further orphan_seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 24 * 3600,
+        url_expiry_hours: int = 24,
+        url_refresh_margin: float = 300.0,
+        orphan_seconds: float = 7 * 24 * 3600,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.orphan_seconds = orphan_seconds
+        self.url_expiry_hours = url_expiry_hours
+        self.url_refresh_margin = url_refresh_margin
+        # API keys seen by this process, needed to delete their files; never persisted
+        self._keys: Dict[str, str] = {}
+        # (api_key, file_id) of stale entries found by lookup, for the sweeper to delete
+        self._expired: List[tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self.stats = {"uploads_skipped": 0, "urls_reused": 0, "uploads": 0, "deleted": 0, "invalidated": 0, "orphaned": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "account TEXT NOT NULL, sha256 TEXT NOT NULL, file_id TEXT NOT NULL, url TEXT, url_expires REAL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (account, sha256))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_last_used ON files(last_used)")
+
+    def lookup(self, api_key: str, sha256: str) -> Optional[dict]:
+        """Return the live entry for a document, with url set to None if it must be refreshed"""
+        account = key_fingerprint(api_key)
+        now = time.time()
+        with self._lock:
+            self._keys[account] = api_key
+            row = self._db.execute(
+                "SELECT file_id, url, url_expires, last_used FROM files WHERE account = ? AND sha256 = ?",
+                (account, sha256),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["last_used"] < now - self.ttl_seconds:
+                # The key is at hand now, which the sweeper may never have; the caller uploads afresh
+                self._db.execute("DELETE FROM files WHERE account = ? AND sha256 = ?", (account, sha256))
+                self._expired.append((api_key, row["file_id"]))
+                return None
+            self._db.execute(
+                "UPDATE files SET last_used = ? WHERE account = ? AND sha256 = ?", (now, account, sha256)
+            )
+        entry = dict(row)
+        if not entry["url"] or (entry["url_expires"] or 0) - self.url_refresh_margin <= now:
+            entry["url"] = None
+        return entry
+
+    def record(self, api_key: str, sha256: str, file_id: str, url: str) -> None:
+        """Store a newly uploaded file or a refreshed signed URL"""
+        account = key_fingerprint(api_key)
+        now = time.time()
+        with self._lock:
+            self._keys[account] = api_key
+            self._db.execute(
+                "INSERT INTO files (account, sha256, file_id, url, url_expires, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (account, sha256) DO UPDATE SET "
+                "file_id = excluded.file_id, url = excluded.url, url_expires = excluded.url_expires, "
+                "last_used = excluded.last_used",
+                (account, sha256, file_id, url, now + self.url_expiry_hours * 3600, now, now),
+            )
+
+    def forget(self, api_key: str, sha256: str) -> None:
+        """Drop an entry whose remote file turned out to be unusable"""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM files WHERE account = ? AND sha256 = ?", (key_fingerprint(api_key), sha256)
+            )
+        self.stats["invalidated"] += 1
+
+    def take_stale(self, limit: int) -> List[tuple[str, str]]:
+        """Remove up to limit stale entries whose API key this process knows; returns (api_key, file_id) pairs
+
+        Entries leave the registry before their files are deleted, so a concurrent request
+        re-uploads instead of picking up a file that is about to disappear. Orphaned entries
+        are removed as well, but cannot be returned for deletion.
+        """
+        now = time.time()
+        cutoff = now - self.ttl_seconds
+        with self._lock:
+            taken, self._expired = self._expired[:limit], self._expired[limit:]
+            self._expire_orphans(now - self.ttl_seconds - self.orphan_seconds)
+            rows = self._db.execute(
+                "SELECT account, sha256, file_id FROM files WHERE last_used < ? ORDER BY last_used", (cutoff,)
+            ).fetchall()
+            for row in rows:
+                if len(taken) >= limit:
+                    break
+                if row["account"] not in self._keys:
+                    continue
+                self._db.execute(
+                    "DELETE FROM files WHERE account = ? AND sha256 = ?", (row["account"], row["sha256"])
+                )
+                taken.append((self._keys[row["account"]], row["file_id"]))
+        return taken
+
+    def _expire_orphans(self, cutoff: float) -> None:
+        """Drop long-stale entries of accounts this process has no key for (callers hold the lock)"""
+        rows = self._db.execute(
+            "SELECT account, sha256, file_id FROM files WHERE last_used < ?", (cutoff,)
+        ).fetchall()
+        for row in rows:
+            if row["account"] in self._keys:
+                continue
+            self._db.execute(
+                "DELETE FROM files WHERE account = ? AND sha256 = ?", (row["account"], row["sha256"])
+            )
+            self.stats["orphaned"] += 1
+            logger.warning(f"Dropped registry entry for Mistral file {row['file_id']} of an account with no known API key")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class RegistrySweeper:
+    """Background task that deletes stale remote files in batches"""
+
+    def __init__(
+        self,
+        registry: FileRegistry,
+        delete: Callable[[str, str], Awaitable[None]],
+        interval: float = 600.0,
+        batch_size: int = 50,
+    ):
+        self.registry = registry
+        self.delete = delete
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def sweep(self) -> int:
+        """Delete one batch of stale files; returns how many entries were taken from the registry"""
+        stale = await asyncio.to_thread(self.registry.take_stale, self.batch_size)
+        for api_key, file_id in stale:
+            try:
+                await self.delete(api_key, file_id)
+                self.registry.stats["deleted"] += 1
+            except Exception as e:
+                # Already gone remotely, or a transient failure; either way the entry is no longer offered
+                logger.warning(f"Could not delete Mistral file {file_id}: {e}")
+        return len(stale)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                while await self.sweep() == self.batch_size:
+                    pass
+            except Exception as e:
+                logger.warning(f"File registry sweep failed: {e}")
+
+
+def registry_from_env() -> Optional[FileRegistry]:
+    """Create the uploaded-file registry configured by OCR_FILE_REGISTRY_* environment variables"""
+    if os.environ.get("OCR_FILE_REGISTRY_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    return FileRegistry(
+        path=os.environ.get("OCR_FILE_REGISTRY_PATH", os.path.join(".cache", "mistral_files.sqlite3")),
+        ttl_seconds=float(os.environ.get("OCR_FILE_REGISTRY_TTL_SECONDS", str(24 * 3600))),
+        url_expiry_hours=int(os.environ.get("OCR_FILE_REGISTRY_URL_EXPIRY_HOURS", "24")),
+        orphan_seconds=float(os.environ.get("OCR_FILE_REGISTRY_ORPHAN_SECONDS", str(7 * 24 * 3600))),
+    )
@@ -0,0 +1,121 @@
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from document import Document, open_content
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    """Settings for shrinking images before they are sent to OCR"""
+
+    enabled: bool = True
+    max_dimension: int = 3000
+    target_dpi: Optional[int] = None
+    grayscale: bool = False
+    image_format: str = "JPEG"
+    quality: int = 90
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable description of the settings, part of the result cache key"""
+        if not self.enabled:
+            return "preprocess:off"
+        return (
+            f"preprocess:{self.max_dimension}:{self.target_dpi}:{int(self.grayscale)}:"
+            f"{self.image_format}:{self.quality}"
+        )
+
+
+@dataclass
+class PreprocessStats:
+    original_bytes: int
+    output_bytes: int
+    original_size: tuple[int, int]
+    output_size: tuple[int, int]
+    applied: bool
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.output_bytes
+
+
+def preprocess_image(document: Document, config: PreprocessConfig) -> tuple[Document, PreprocessStats]:
+    """Fix EXIF orientation, downscale, optionally grayscale and recompress an image
+
+    The original document is returned unchanged if pre-processing is disabled, the image
+    cannot be decoded, or the re-encoded image would not be smaller.
+    """
+    if not config.enabled:
+        size = len(document.content)
+        return document, PreprocessStats(size, size, (0, 0), (0, 0), False)
+
+    unchanged = PreprocessStats(len(document.content), len(document.content), (0, 0), (0, 0), False)
+    try:
+        image = Image.open(open_content(document.content))
+    except (OSError, Image.DecompressionBombError):
+        # Not something Pillow can (or should) decode; let the OCR service decide what to do with it
+        return document, unchanged
+
+    try:
+        with image:
+            original_size = image.size
+            unchanged = PreprocessStats(len(document.content), len(document.content), original_size, original_size, False)
+            output, output_size = _reencode(image, config)
+    except Exception:
+        # Pillow decodes lazily, so truncated or malformed data and decompression bombs only
+        # surface here; sending the original is never worse than failing the request
+        return document, unchanged
+
+    if len(output) >= len(document.content):
+        return document, unchanged
+
+    extension = FORMAT_EXTENSIONS.get(config.image_format.upper(), ".jpg")
+    shrunk = Document(file_name=f"{document.stem}{extension}", content=output)
+    return shrunk, PreprocessStats(len(document.content), len(output), original_size, output_size, True)
+
+
+def _reencode(image: Image.Image, config: PreprocessConfig) -> tuple[bytes, tuple[int, int]]:
+    """The image oriented, scaled and encoded as configured, with its new size"""
+    processed = ImageOps.exif_transpose(image)
+
+    scale = 1.0
+    dpi = image.info.get("dpi")
+    if config.target_dpi and dpi and dpi[0] and dpi[0] > config.target_dpi:
+        scale = config.target_dpi / float(dpi[0])
+    if config.max_dimension:
+        scale = min(scale, config.max_dimension / float(max(processed.size)))
+    if scale < 1.0:
+        new_size = (max(1, round(processed.width * scale)), max(1, round(processed.height * scale)))
+        processed = processed.resize(new_size, Image.LANCZOS)
+
+    if config.grayscale:
+        processed = processed.convert("L")
+    elif processed.mode not in ("RGB", "L"):
+        # JPEG has no alpha channel; flatten transparency onto white
+        background = Image.new("RGB", processed.size, "white")
+        rgba = processed.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        processed = background
+
+    buffer = io.BytesIO()
+    processed.save(buffer, format=config.image_format, quality=config.quality, optimize=True)
+    return buffer.getvalue(), processed.size
+
+
+def config_from_env() -> PreprocessConfig:
+    """Create the pre-processing settings from OCR_PREPROCESS_* environment variables"""
+    target_dpi = os.environ.get("OCR_PREPROCESS_TARGET_DPI")
+    return PreprocessConfig(
+        enabled=os.environ.get("OCR_PREPROCESS_ENABLED", "true").lower() not in ("0", "false", "no"),
+        max_dimension=int(os.environ.get("OCR_PREPROCESS_MAX_DIMENSION", "3000")),
+        target_dpi=int(target_dpi) if target_dpi else None,
+        grayscale=os.environ.get("OCR_PREPROCESS_GRAYSCALE", "false").lower() in ("1", "true", "yes"),
+        image_format=os.environ.get("OCR_PREPROCESS_FORMAT", "JPEG").upper(),
+        quality=int(os.environ.get("OCR_PREPROCESS_QUALITY", "90")),
+    )
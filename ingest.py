@@ -0,0 +1,111 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+from document import Document
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class SpoolLimitError(Exception):
+    """A stream turned out larger than the size it was allowed to spool"""
+
+    def __init__(self, file_name: str, max_bytes: int):
+        super().__init__(f"{file_name} exceeds {max_bytes} bytes")
+        self.file_name = file_name
+        self.max_bytes = max_bytes
+
+
+@dataclass(frozen=True)
+class SpoolConfig:
+    """Where and from what size uploads are spooled to disk instead of being held in memory"""
+
+    directory: str = os.path.join(".cache", "spool")
+    memory_limit: int = 4 * 1024 * 1024
+
+
+class Spool:
+    """Accumulates a document chunk by chunk, hashing it on the fly
+
+    Content stays in memory up to the memory limit and is then moved to an anonymous file
+    in the spool directory. The finished document maps that file instead of reading it
+    back, and the file has no name on disk, so it is freed with the last reference to the
+    document even if a request fails or the process dies.
+    """
+
+    def __init__(self, config: SpoolConfig):
+        self.config = config
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buffer: Optional[io.BytesIO] = io.BytesIO()
+        self._file: Optional[BinaryIO] = None
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self.size > self.config.memory_limit:
+            os.makedirs(self.config.directory, exist_ok=True)
+            self._file = tempfile.TemporaryFile(dir=self.config.directory)
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer.write(chunk)
+
+    def document(self, file_name: str) -> Document:
+        """The spooled content as a Document whose hash is already known"""
+        if self._file is None:
+            content = self._buffer.getvalue()
+        else:
+            self._file.flush()
+            content = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return Document.with_sha256(file_name, content, self._hash.hexdigest())
+
+    def close(self) -> None:
+        # The mapping, if any, keeps the file's data alive after its descriptor is closed
+        if self._file is not None:
+            self._file.close()
+        self._buffer = None
+
+
+def spool_stream(stream: BinaryIO, file_name: str, config: SpoolConfig, max_bytes: Optional[int] = None) -> Document:
+    """Read a file object to its end in chunks and return it as a Document
+
+    With max_bytes, SpoolLimitError is raised as soon as more than that has been read, so a
+    decompressing stream cannot fill the disk before its size is known.
+    """
+    spool = Spool(config)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            spool.write(chunk)
+            if max_bytes is not None and spool.size > max_bytes:
+                raise SpoolLimitError(Path(file_name).name, max_bytes)
+        return spool.document(Path(file_name).name)
+    finally:
+        spool.close()
+
+
+def map_path(path: Union[str, Path], config: SpoolConfig) -> Document:
+    """Load a stored file as a Document, memory-mapping it rather than reading it when it is large"""
+    path = Path(path)
+    if path.stat().st_size <= config.memory_limit:
+        return Document.from_path(path)
+    with open(path, "rb") as f:
+        return Document(file_name=path.name, content=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def config_from_env() -> SpoolConfig:
+    """Create the spooling settings from OCR_SPOOL_* environment variables"""
+    return SpoolConfig(
+        directory=os.environ.get("OCR_SPOOL_DIR", os.path.join(".cache", "spool")),
+        memory_limit=int(os.environ.get("OCR_SPOOL_MEMORY_BYTES", str(4 * 1024 * 1024))),
+    )
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobQueue:
+    """Persistent SQLite-backed queue of OCR jobs that survives process restarts
+
+    A job belongs to the account that submitted it and is only returned to that account.
+    The submitter's API key is needed to run the job, so it is stored in jobs.sqlite3 in
+    plain text while the job is queued, running or waiting for a retry, and cleared as
+    soon as the job succeeds or finally fails.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_queued: int = 1000,
+        max_attempts: int = 3,
+        retry_backoff: float = 5.0,
+        lease_seconds: float = 900.0,
+    ):
+        self.directory = directory
+        self.files_dir = os.path.join(directory, "files")
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        os.makedirs(self.files_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(directory, "jobs.sqlite3"), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, account TEXT NOT NULL, status TEXT NOT NULL, file_name TEXT NOT NULL, "
+            "file_path TEXT NOT NULL, api_key TEXT, attempts INTEGER NOT NULL DEFAULT 0, progress REAL NOT NULL DEFAULT 0, "
+            "error TEXT, result TEXT, available_at REAL NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, available_at)")
+
+    def submit(self, account: str, file_name: str, content: bytes, api_key: Optional[str] = None) -> str:
+        """Persist the document and enqueue a job for it on behalf of account, returning the job ID"""
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.files_dir, job_id)
+        file_path = os.path.join(job_dir, Path(file_name).name)
+        now = time.time()
+        with self._lock:
+            (queued,) = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()
+            if queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({queued} jobs pending)")
+            os.makedirs(job_dir)
+            with open(file_path, "wb") as f:
+                f.write(content)
+            self._db.execute(
+                "INSERT INTO jobs (id, account, status, file_name, file_path, api_key, available_at, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, account, file_name, file_path, api_key, now, now, now),
+            )
+        return job_id
+
+    def get(self, account: str, job_id: str) -> Optional[dict]:
+        """Return the public fields of one of an account's jobs, or None if it has no such job"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, file_name, attempts, progress, error, result, created_at, updated_at "
+                "FROM jobs WHERE id = ? AND account = ?",
+                (job_id, account),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def claim(self) -> Optional[dict]:
+        """Atomically lease the oldest runnable job and return it
+
+        Running jobs hold a lease in available_at; a job whose lease has expired was
+        abandoned by a crashed or restarted process and is picked up again.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, file_path, api_key, attempts FROM jobs "
+                    "WHERE status IN ('queued', 'running') AND available_at <= ? ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, progress = 0.1, "
+                        "available_at = ?, updated_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, now, row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def renew(self, job_id: str, attempts: int) -> bool:
+        """Extend the lease of a job this attempt still holds; False once it has been lost or finished"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET available_at = ?, updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (now + self.lease_seconds, now, job_id, attempts),
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, result_json: str, attempts: int) -> bool:
+        return self._finish(job_id, attempts, "succeeded", result=result_json)
+
+    def fail(self, job_id: str, error: str, attempts: int) -> bool:
+        """Record a failed attempt, requeueing with exponential backoff until attempts run out
+
+        Like complete and release, this only applies while the attempt still holds the job, so
+        a stale attempt whose lease was taken over cannot overwrite the newer attempt's outcome.
+        """
+        if attempts < self.max_attempts:
+            now = time.time()
+            with self._lock:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = 'queued', progress = 0, error = ?, available_at = ?, updated_at = ? "
+                    "WHERE id = ? AND status = 'running' AND attempts = ?",
+                    (error, now + self.retry_backoff * 2 ** (attempts - 1), now, job_id, attempts),
+                )
+            return cursor.rowcount > 0
+        return self._finish(job_id, attempts, "failed", error=error)
+
+    def release(self, job_id: str, attempts: int) -> None:
+        """Return an interrupted job to the queue without counting the attempt"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, progress = 0, available_at = ?, "
+                "updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time(), time.time(), job_id, attempts),
+            )
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _finish(self, job_id: str, attempts: int, status: str, result: Optional[str] = None, error: Optional[str] = None) -> bool:
+        # Every terminal outcome (succeeded, or failed for good) comes through here. Terminal jobs no longer
+        # need the uploaded document or the caller's API key. Requeued and released jobs keep both for the next attempt.
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, api_key = NULL, progress = 1, updated_at = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (status, result, error, time.time(), job_id, attempts),
+            )
+        if cursor.rowcount == 0:
+            return False
+        shutil.rmtree(os.path.join(self.files_dir, job_id), ignore_errors=True)
+        return True
+
+
+class JobWorkerPool:
+    """Fixed number of asyncio workers draining a JobQueue"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        process: Callable[[str, Optional[str]], Awaitable[str]],
+        workers: int = 4,
+        poll_interval: float = 1.0,
+    ):
+        self.queue = queue
+        self.process = process
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    def notify(self) -> None:
+        """Wake idle workers after a job has been submitted"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _keep_lease(self, job: dict) -> None:
+        """Renew a running job's lease until cancelled, so a long job is not claimed again elsewhere"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.renew, job["id"], job["attempts"]):
+                logger.warning(f"Job {job['id']} attempt {job['attempts']} lost its lease")
+                return
+
+    async def _run(self) -> None:
+        while True:
+            # Claiming can wait on other processes' write locks, so keep it off the event loop
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            if job["attempts"] > self.queue.max_attempts:
+                # Repeatedly abandoned by crashing processes
+                await asyncio.to_thread(self.queue.fail, job["id"], "Job exceeded its retry limit", job["attempts"])
+                continue
+            lease = asyncio.ensure_future(self._keep_lease(job))
+            try:
+                result_json = await self.process(job["file_path"], job["api_key"])
+            except asyncio.CancelledError:
+                # Shutting down: hand the job straight back instead of waiting for the lease to expire
+                self.queue.release(job["id"], job["attempts"])
+                raise
+            except Exception as e:
+                logger.warning(f"Job {job['id']} attempt {job['attempts']} failed: {e}")
+                await asyncio.to_thread(self.queue.fail, job["id"], str(e), job["attempts"])
+            else:
+                await asyncio.to_thread(self.queue.complete, job["id"], result_json, job["attempts"])
+            finally:
+                lease.cancel()
+
+
+def queue_from_env() -> JobQueue:
+    """Create the job queue configured by OCR_JOB_* environment variables"""
+    return JobQueue(
+        directory=os.environ.get("OCR_JOBS_DIR", os.path.join(".cache", "jobs")),
+        max_queued=int(os.environ.get("OCR_JOB_MAX_QUEUED", "1000")),
+        max_attempts=int(os.environ.get("OCR_JOB_MAX_ATTEMPTS", "3")),
+        retry_backoff=float(os.environ.get("OCR_JOB_RETRY_BACKOFF_SECONDS", "5")),
+        lease_seconds=float(os.environ.get("OCR_JOB_LEASE_SECONDS", "900")),
+    )
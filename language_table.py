@@ -0,0 +1,213 @@
+"""Precomputed ISO 639-1 language names for the Language enum
+
+Generated from pycountry so that importing the API does not have to load and walk the
+full pycountry language database. Regenerate after upgrading pycountry with:
+
+    python language_table.py
+"""
+
+LANGUAGE_NAMES = (
+    'Afar',
+    'Abkhazian',
+    'Afrikaans',
+    'Akan',
+    'Amharic',
+    'Arabic',
+    'Aragonese',
+    'Assamese',
+    'Avaric',
+    'Avestan',
+    'Aymara',
+    'Azerbaijani',
+    'Bashkir',
+    'Bambara',
+    'Belarusian',
+    'Bengali',
+    'Bislama',
+    'Tibetan',
+    'Bosnian',
+    'Breton',
+    'Bulgarian',
+    'Catalan',
+    'Czech',
+    'Chamorro',
+    'Chechen',
+    'Church Slavic',
+    'Chuvash',
+    'Cornish',
+    'Corsican',
+    'Cree',
+    'Welsh',
+    'Danish',
+    'German',
+    'Divehi',
+    'Dzongkha',
+    'Modern Greek (1453-)',
+    'English',
+    'Esperanto',
+    'Estonian',
+    'Basque',
+    'Ewe',
+    'Faroese',
+    'Persian',
+    'Fijian',
+    'Finnish',
+    'French',
+    'Western Frisian',
+    'Fulah',
+    'Scottish Gaelic',
+    'Irish',
+    'Galician',
+    'Manx',
+    'Guarani',
+    'Gujarati',
+    'Haitian',
+    'Hausa',
+    'Serbo-Croatian',
+    'Hebrew',
+    'Herero',
+    'Hindi',
+    'Hiri Motu',
+    'Croatian',
+    'Hungarian',
+    'Armenian',
+    'Igbo',
+    'Ido',
+    'Sichuan Yi',
+    'Inuktitut',
+    'Interlingue',
+    'Interlingua (International Auxiliary Language Association)',
+    'Indonesian',
+    'Inupiaq',
+    'Icelandic',
+    'Italian',
+    'Javanese',
+    'Japanese',
+    'Kalaallisut',
+    'Kannada',
+    'Kashmiri',
+    'Georgian',
+    'Kanuri',
+    'Kazakh',
+    'Khmer',
+    'Kikuyu',
+    'Kinyarwanda',
+    'Kirghiz',
+    'Komi',
+    'Kongo',
+    'Korean',
+    'Kuanyama',
+    'Kurdish',
+    'Lao',
+    'Latin',
+    'Latvian',
+    'Limburgan',
+    'Lingala',
+    'Lithuanian',
+    'Luxembourgish',
+    'Luba-Katanga',
+    'Ganda',
+    'Marshallese',
+    'Malayalam',
+    'Marathi',
+    'Macedonian',
+    'Malagasy',
+    'Maltese',
+    'Mongolian',
+    'Maori',
+    'Malay (macrolanguage)',
+    'Burmese',
+    'Nauru',
+    'Navajo',
+    'South Ndebele',
+    'North Ndebele',
+    'Ndonga',
+    'Nepali (macrolanguage)',
+    'Dutch',
+    'Norwegian Nynorsk',
+    'Norwegian Bokmål',
+    'Norwegian',
+    'Chichewa',
+    'Occitan (post 1500)',
+    'Ojibwa',
+    'Oriya (macrolanguage)',
+    'Oromo',
+    'Ossetian',
+    'Panjabi',
+    'Pali',
+    'Polish',
+    'Portuguese',
+    'Pushto',
+    'Quechua',
+    'Romansh',
+    'Romanian',
+    'Rundi',
+    'Russian',
+    'Sango',
+    'Sanskrit',
+    'Sinhala',
+    'Slovak',
+    'Slovenian',
+    'Northern Sami',
+    'Samoan',
+    'Shona',
+    'Sindhi',
+    'Somali',
+    'Southern Sotho',
+    'Spanish',
+    'Albanian',
+    'Sardinian',
+    'Serbian',
+    'Swati',
+    'Sundanese',
+    'Swahili (macrolanguage)',
+    'Swedish',
+    'Tahitian',
+    'Tamil',
+    'Tatar',
+    'Telugu',
+    'Tajik',
+    'Tagalog',
+    'Thai',
+    'Tigrinya',
+    'Tonga (Tonga Islands)',
+    'Tswana',
+    'Tsonga',
+    'Turkmen',
+    'Turkish',
+    'Twi',
+    'Uighur',
+    'Ukrainian',
+    'Urdu',
+    'Uzbek',
+    'Venda',
+    'Vietnamese',
+    'Volapük',
+    'Walloon',
+    'Wolof',
+    'Xhosa',
+    'Yiddish',
+    'Yoruba',
+    'Zhuang',
+    'Chinese',
+    'Zulu',
+)
+
+
+def _generate() -> None:
+    import re
+
+    import pycountry
+
+    names = tuple(lang.name for lang in pycountry.languages if hasattr(lang, 'alpha_2'))
+    with open(__file__, encoding="utf-8") as f:
+        source = f.read()
+    table = "LANGUAGE_NAMES = (\n" + "".join(f"    {name!r},\n" for name in names) + ")\n"
+    source = re.sub(r"LANGUAGE_NAMES = \(.*?\n\)\n", lambda _: table, source, count=1, flags=re.S)
+    with open(__file__, "w", encoding="utf-8") as f:
+        f.write(source)
+    print(f"Wrote {len(names)} languages")
+
+
+if __name__ == "__main__":
+    _generate()
@@ -0,0 +1,110 @@
+import io
+import logging
+from typing import Any, List
+
+from document import open_content
+
+logger = logging.getLogger(__name__)
+
+# pypdf is imported on first use; it is one of the slowest imports in the API worker
+
+
+def pdf_page_count(content: bytes) -> int:
+    """Number of pages in a PDF, or 0 if it cannot be parsed locally (left to the OCR service)"""
+    from pypdf import PdfReader
+
+    try:
+        return len(PdfReader(open_content(content)).pages)
+    except Exception as e:
+        # pypdf raises ValueError, KeyError, RecursionError, ... as well as PyPdfError on malformed files
+        logger.warning(f"Could not count PDF pages, leaving the document to OCR: {e!r}")
+        return 0
+
+
+def split_pdf(content: bytes, pages_per_chunk: int) -> List[tuple[int, bytes]]:
+    """Split a PDF into chunks of consecutive pages, returning (first page index, PDF bytes) pairs
+
+    A PDF that cannot be split locally comes back as a single chunk, left whole to the OCR service.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    try:
+        reader = PdfReader(open_content(content))
+        chunks = []
+        for start in range(0, len(reader.pages), pages_per_chunk):
+            writer = PdfWriter()
+            for page in reader.pages[start:start + pages_per_chunk]:
+                writer.add_page(page)
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            chunks.append((start, buffer.getvalue()))
+    except Exception as e:
+        logger.warning(f"Could not split PDF, sending it as one chunk: {e!r}")
+        return [(0, bytes(content))]
+    return chunks
+
+
+def extract_pages(content: bytes, indexes: List[int]) -> bytes:
+    """A new PDF holding only the given pages, in the given order"""
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(open_content(content))
+    writer = PdfWriter()
+    for index in indexes:
+        writer.add_page(reader.pages[index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _union(first: list, second: list) -> list:
+    merged = list(first)
+    for item in second:
+        if item not in merged:
+            merged.append(item)
+    return merged
+
+
+def merge_values(first: Any, second: Any, keep_first: bool = False) -> Any:
+    """Deterministically merge two values extracted from consecutive chunks
+
+    Dicts merge key by key, lists are concatenated without repeating identical items,
+    and conflicting scalars are kept side by side in chunk order. With keep_first,
+    for values whose type a schema fixes, a conflicting scalar keeps the first chunk's
+    value instead, so the merged value still has the type both chunks were validated with.
+    """
+    if first is None or first == "" or first == [] or first == {}:
+        return second
+    if second is None or second == "" or second == [] or second == {} or first == second:
+        return first
+    if isinstance(first, dict) and isinstance(second, dict):
+        merged = dict(first)
+        for key, value in second.items():
+            merged[key] = merge_values(merged[key], value, keep_first) if key in merged else value
+        return merged
+    if keep_first and not (isinstance(first, list) and isinstance(second, list)):
+        return first
+    if isinstance(first, list):
+        return _union(first, second if isinstance(second, list) else [second])
+    if isinstance(second, list):
+        return _union([first], second)
+    return [first, second]
+
+
+def merge_chunk_results(results: List[dict], keep_first: bool = False) -> dict:
+    """Merge per-chunk structured results in chunk order
+
+    Top-level scalar fields (file name and the like) keep the first chunk's value so the
+    merged dict still validates against the response model; everything below merges fully
+    (see merge_values for keep_first).
+    """
+    merged: dict = {}
+    for result in results:
+        for key, value in result.items():
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(merged[key], (dict, list)):
+                merged[key] = merge_values(merged[key], value, keep_first)
+            elif merged[key] in (None, ""):
+                merged[key] = value
+    return merged
@@ -0,0 +1,143 @@
+import re
+from typing import Dict, List
+
+# Bump when the output shape changes so cached local results are recomputed
+PARSER_VERSION = 2
+
+# Lists the parser itself fills in every section; fields and headings never take these names
+TEXT, TABLES = "text", "tables"
+RESERVED = (TEXT, TABLES)
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_KEY_VALUE = re.compile(r"^(?:[-*+]\s+)?([^:|]{1,60}?)\s*:\s+(.+)$")
+_IMAGE = re.compile(r"^!\[[^\]]*\]\([^)]*\)$")
+_EMPHASIS = re.compile(r"(\*\*|__|\*|`)")
+
+
+def _clean(text: str) -> str:
+    return _EMPHASIS.sub("", text).strip()
+
+
+def field_name(label: str) -> str:
+    """Normalise a label such as 'Invoice Number' to 'invoice_number'"""
+    return re.sub(r"[^0-9a-z]+", "_", _clean(label).lower()).strip("_")
+
+
+def _add(section: dict, key: str, value) -> None:
+    """Set a field, collecting repeated keys into a list instead of overwriting"""
+    if key in RESERVED:
+        key = f"{key}_field"
+    if key not in section:
+        section[key] = value
+    elif isinstance(section[key], list) and not isinstance(value, list):
+        section[key].append(value)
+    else:
+        section[key] = [section[key], value]
+
+
+def _cells(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [_clean(cell) for cell in line.split("|")]
+
+
+def parse_table(lines: List[str]) -> List[Dict[str, str]]:
+    """Turn markdown table lines into a list of row dicts keyed by the header cells"""
+    rows = [_cells(line) for line in lines if not _TABLE_SEPARATOR.match(line.strip())]
+    if not rows:
+        return []
+    header = [field_name(cell) or f"column_{i + 1}" for i, cell in enumerate(rows[0])]
+    table = []
+    for cells in rows[1:]:
+        if not any(cells):
+            continue
+        row = {}
+        for i, cell in enumerate(cells):
+            row[header[i] if i < len(header) else f"column_{i + 1}"] = cell
+        table.append(row)
+    return table
+
+
+def _key_values(line: str) -> List[tuple[str, str]]:
+    """'Key: Value' pairs on a line, including several separated by ' | '; empty if any part is not one"""
+    pairs = []
+    for part in line.split(" | "):
+        match = _KEY_VALUE.match(_clean(part) if "**" in part else part.strip())
+        if not match or not re.search(r"[A-Za-z]", match.group(1)):
+            return []
+        key, value = field_name(match.group(1)), _clean(match.group(2))
+        if not key or not value:
+            return []
+        pairs.append((key, value))
+    return pairs
+
+
+def parse_markdown(markdown: str) -> dict:
+    """Deterministically structure OCR markdown without a language model
+
+    Headings become nested sections, markdown tables become lists of row dicts under
+    "tables" and 'Key: Value' lines become fields; any other text is kept under "text".
+    A field or heading that would itself be called "text" or "tables" is renamed
+    ("text_field", "tables (2)") so it cannot collide with those lists.
+    """
+    root: dict = {}
+    stack: List[tuple[int, dict]] = [(0, root)]
+    lines = markdown.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        section = stack[-1][1]
+
+        if not line or _IMAGE.match(line):
+            i += 1
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            level, title = len(heading.group(1)), _clean(heading.group(2))
+            while stack[-1][0] >= level:
+                stack.pop()
+            parent = stack[-1][1]
+            name, suffix = title, 2
+            while name in parent or name in RESERVED:
+                name, suffix = f"{title} ({suffix})", suffix + 1
+            parent[name] = {}
+            stack.append((level, parent[name]))
+            i += 1
+            continue
+
+        if line.startswith("|"):
+            table_lines = []
+            while i < len(lines) and lines[i].strip().startswith("|"):
+                table_lines.append(lines[i])
+                i += 1
+            table = parse_table(table_lines)
+            if table:
+                section.setdefault(TABLES, []).append(table)
+            continue
+
+        pairs = _key_values(line)
+        if pairs:
+            for key, value in pairs:
+                _add(section, key, value)
+        else:
+            section.setdefault(TEXT, []).append(_clean(line))
+        i += 1
+    return root
+
+
+def markdown_topics(markdown: str, limit: int = 10) -> List[str]:
+    """The document's top-level headings, used as its topics"""
+    headings = [(len(m.group(1)), _clean(m.group(2))) for m in map(_HEADING.match, markdown.splitlines()) if m]
+    if not headings:
+        return []
+    top = min(level for level, _ in headings)
+    topics: List[str] = []
+    for level, title in headings:
+        if level == top and title not in topics:
+            topics.append(title)
+    return topics[:limit]
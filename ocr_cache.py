@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Optional, Type
+
+from pydantic import BaseModel
+
+
+@lru_cache(maxsize=1024)
+def schema_fingerprint(response_model: Type[BaseModel]) -> str:
+    """Hash of a response model's JSON schema, computed once per model"""
+    schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode()).hexdigest()
+
+
+def cache_key(content_sha256: str, models: Iterable[str], response_model: Type[BaseModel]) -> str:
+    """Build a content-addressed cache key from the file hash, model names and response schema"""
+    meta = hashlib.sha256(f"{','.join(models)}|{schema_fingerprint(response_model)}".encode()).hexdigest()
+    return f"{content_sha256}:{meta[:16]}"
+
+
+class ResultCache:
+    """Two-tier cache of serialized OCR results: a bounded in-process LRU in front of SQLite"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_items: int = 256,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.path = path
+        self.memory_items = memory_items
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "expired": 0,
+        }
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed)")
+            # The expiry sweep on every store is a range scan on created, not a full table scan
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_created ON results(created)")
+            # Running total of stored bytes, kept by triggers so every worker sharing the file sees it
+            # without summing the table on each store
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)"
+                )
+                self._db.execute(
+                    "INSERT OR IGNORE INTO totals (id, size) SELECT 0, COALESCE(SUM(size), 0) FROM results"
+                )
+                self._db.execute(
+                    "CREATE TRIGGER IF NOT EXISTS results_added AFTER INSERT ON results "
+                    "BEGIN UPDATE totals SET size = size + new.size WHERE id = 0; END"
+                )
+                self._db.execute(
+                    "CREATE TRIGGER IF NOT EXISTS results_removed AFTER DELETE ON results "
+                    "BEGIN UPDATE totals SET size = size - old.size WHERE id = 0; END"
+                )
+                self._db.execute(
+                    "CREATE TRIGGER IF NOT EXISTS results_resized AFTER UPDATE OF size ON results "
+                    "BEGIN UPDATE totals SET size = size + new.size - old.size WHERE id = 0; END"
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached JSON payload for key, or None on a miss
+
+        Blocks on SQLite; async callers run it in a thread, as they do set.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if now - created <= self.ttl_seconds:
+                        self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                        self._remember(key, created, value)
+                        self.stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store a JSON payload in both tiers, evicting old entries as needed"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self.stats["stores"] += 1
+            if self._db is not None:
+                # An upsert rather than INSERT OR REPLACE, whose implicit delete would not fire the totals trigger
+                self._db.execute(
+                    "INSERT INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "created = excluded.created, accessed = excluded.accessed",
+                    (key, value, len(value.encode()), now, now),
+                )
+                self._evict_disk(now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+
+    def snapshot(self) -> dict:
+        """Return counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_items"] = len(self._memory)
+            if self._db is not None:
+                (stats["disk_items"],) = self._db.execute("SELECT COUNT(*) FROM results").fetchone()
+                stats["disk_bytes"] = self._disk_bytes()
+            return stats
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def _disk_bytes(self) -> int:
+        (size,) = self._db.execute("SELECT size FROM totals WHERE id = 0").fetchone()
+        return size
+
+    def _evict_disk(self, now: float) -> None:
+        expired = self._db.execute(
+            "DELETE FROM results WHERE created < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.stats["disk_evictions"] += max(expired, 0)
+
+        total = self._disk_bytes()
+        if total <= self.max_disk_bytes:
+            return
+        # Drop least recently accessed rows until we are back under the size budget
+        for key, size in self._db.execute(
+            "SELECT key, size FROM results ORDER BY accessed ASC"
+        ).fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            self.stats["disk_evictions"] += 1
+
+
+def cache_from_env() -> Optional[ResultCache]:
+    """Create the result cache configured by OCR_CACHE_* environment variables"""
+    if os.environ.get("OCR_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    path = os.environ.get("OCR_CACHE_PATH", os.path.join(".cache", "ocr_results.sqlite3"))
+    return ResultCache(
+        path=path or None,
+        memory_items=int(os.environ.get("OCR_CACHE_MEMORY_ITEMS", "256")),
+        ttl_seconds=float(os.environ.get("OCR_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        max_disk_bytes=int(os.environ.get("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    )
@@ -0,0 +1,170 @@
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import List
+
+_IMAGE_REF = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_PAGE_NUMBER = re.compile(r"^\s*(?:page\s*)?\d+\s*(?:(?:of|/)\s*\d+)?\s*$", re.IGNORECASE)
+_DIGITS = re.compile(r"\d+")
+_PAGE_REFERENCE = re.compile(r"\bpage\s*\d+|\d+\s*(?:of|/)\s*\d+", re.IGNORECASE)
+_INLINE_SPACE = re.compile(r"[ \t]+")
+_CELL_PADDING = re.compile(r"\s*\|\s*")
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
+# Lines at the top and bottom of each page that are candidates for headers and footers
+EDGE_LINES = 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, the same four-characters-per-token budget the rate limiter uses"""
+    return len(text) // 4 + 1
+
+
+@dataclass(frozen=True)
+class CompactionConfig:
+    """Which compaction steps run on OCR markdown before it is sent to the chat model"""
+
+    enabled: bool = True
+    strip_repeated: bool = True
+    strip_images: bool = True
+    normalize_whitespace: bool = True
+    max_table_rows: int = 200
+    # A header/footer line must repeat on at least this share of pages to be removed
+    repeat_ratio: float = 0.6
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable description of the settings, part of the result cache key"""
+        if not self.enabled:
+            return "compaction:off"
+        return (
+            f"compaction:{int(self.strip_repeated)}:{int(self.strip_images)}:"
+            f"{int(self.normalize_whitespace)}:{self.max_table_rows}:{self.repeat_ratio}"
+        )
+
+
+@dataclass
+class CompactionStats:
+    original_tokens: int
+    compacted_tokens: int
+    repeated_lines_removed: int = 0
+    images_removed: int = 0
+    table_rows_removed: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.compacted_tokens
+
+
+def _edge_indexes(lines: List[str]) -> List[int]:
+    # Table rows are never treated as headers, so tables continued across pages keep their header row
+    content = [i for i, line in enumerate(lines) if line.strip() and not line.lstrip().startswith("|")]
+    return sorted(set(content[:EDGE_LINES] + content[-EDGE_LINES:]))
+
+
+def _edge_key(line: str) -> str:
+    key = line.strip().lower()
+    # Running headers such as "Report - Page 3 of 10" only differ in their page number
+    if _PAGE_REFERENCE.search(key):
+        key = _DIGITS.sub("#", key)
+    return key
+
+
+def strip_repeated_edges(pages: List[str], ratio: float) -> tuple[List[str], int]:
+    """Remove header/footer lines that repeat across pages, plus bare page numbers at page edges"""
+    split = [page.split("\n") for page in pages]
+    seen = Counter()
+    for lines in split:
+        seen.update({_edge_key(lines[i]) for i in _edge_indexes(lines)})
+    threshold = max(2, ratio * len(pages))
+    repeated = {key for key, count in seen.items() if count >= threshold}
+
+    removed = 0
+    result = []
+    for lines in split:
+        drop = set()
+        for i in _edge_indexes(lines):
+            line = lines[i]
+            if _edge_key(line) in repeated or (len(pages) > 1 and _PAGE_NUMBER.match(line)):
+                drop.add(i)
+        removed += len(drop)
+        result.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return result, removed
+
+
+def collapse_tables(markdown: str, max_rows: int) -> tuple[str, int]:
+    """Keep the header and the first and last rows of tables longer than max_rows"""
+    lines = markdown.split("\n")
+    out: List[str] = []
+    removed = 0
+    i = 0
+    while i < len(lines):
+        if not lines[i].lstrip().startswith("|"):
+            out.append(lines[i])
+            i += 1
+            continue
+        start = i
+        while i < len(lines) and lines[i].lstrip().startswith("|"):
+            i += 1
+        table = lines[start:i]
+        header = 2 if len(table) > 1 and _TABLE_SEPARATOR.match(table[1].strip()) else 1
+        rows = table[header:]
+        if len(rows) <= max_rows:
+            out.extend(table)
+            continue
+        keep_tail = max_rows // 4
+        head = rows[:max_rows - keep_tail]
+        tail = rows[len(rows) - keep_tail:] if keep_tail else []
+        omitted = len(rows) - len(head) - len(tail)
+        removed += omitted
+        out.extend(table[:header] + head + [f"| ... {omitted} more rows ... |"] + tail)
+    return "\n".join(out), removed
+
+
+def normalize_whitespace(markdown: str) -> str:
+    lines = []
+    for line in markdown.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            stripped = _CELL_PADDING.sub("|", stripped)
+        else:
+            stripped = _INLINE_SPACE.sub(" ", stripped)
+        lines.append(stripped)
+    return _BLANK_RUNS.sub("\n\n", "\n".join(lines)).strip()
+
+
+def compact_pages(pages: List[str], config: CompactionConfig) -> tuple[str, CompactionStats]:
+    """Join OCR page markdown into a smaller prompt; the input pages are left untouched"""
+    original = "\n\n".join(pages)
+    stats = CompactionStats(estimate_tokens(original), estimate_tokens(original))
+    if not config.enabled:
+        return original, stats
+
+    if config.strip_repeated and len(pages) > 1:
+        pages, stats.repeated_lines_removed = strip_repeated_edges(pages, config.repeat_ratio)
+    markdown = "\n\n".join(pages)
+    if config.strip_images:
+        markdown, stats.images_removed = _IMAGE_REF.subn("", markdown)
+    if config.max_table_rows:
+        markdown, stats.table_rows_removed = collapse_tables(markdown, config.max_table_rows)
+    if config.normalize_whitespace:
+        markdown = normalize_whitespace(markdown)
+    stats.compacted_tokens = estimate_tokens(markdown)
+    return markdown, stats
+
+
+def config_from_env() -> CompactionConfig:
+    """Create the compaction settings from OCR_COMPACTION_* environment variables"""
+    def flag(name: str) -> bool:
+        return os.environ.get(name, "true").lower() not in ("0", "false", "no")
+
+    return CompactionConfig(
+        enabled=flag("OCR_COMPACTION_ENABLED"),
+        strip_repeated=flag("OCR_COMPACTION_STRIP_REPEATED"),
+        strip_images=flag("OCR_COMPACTION_STRIP_IMAGES"),
+        normalize_whitespace=flag("OCR_COMPACTION_NORMALIZE_WHITESPACE"),
+        max_table_rows=int(os.environ.get("OCR_COMPACTION_MAX_TABLE_ROWS", "200")),
+        repeat_ratio=float(os.environ.get("OCR_COMPACTION_REPEAT_RATIO", "0.6")),
+    )
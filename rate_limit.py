@@ -0,0 +1,236 @@
+import asyncio
+import email.utils
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+# Statuses worth retrying; only 429 shrinks the concurrency window
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Failures after which a non-idempotent request certainly did not take effect
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class RateLimitedError(Exception):
+    """Raised when Mistral keeps answering 429 after every retry"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status of an SDK error, or None for anything else"""
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(getattr(error, "raw_response", None), httpx.Response):
+        status = error.raw_response.status_code
+    return status
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Parse the Retry-After header (seconds or HTTP date) of an SDK error, if present"""
+    headers = getattr(error, "headers", None)
+    if headers is None and isinstance(getattr(error, "raw_response", None), httpx.Response):
+        headers = error.raw_response.headers
+    value = headers.get("retry-after") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+class TokenBucket:
+    """Classic token bucket; a non-positive rate means unlimited"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency window: grows by one per window of successes, halves on every 429"""
+
+    def __init__(self, initial: float, minimum: float = 1.0, maximum: float = 64.0, decrease: float = 0.5):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def acquire(self) -> None:
+        while True:
+            pause = self.paused_until - time.monotonic()
+            if pause <= 0 and self.in_flight < max(1, int(self.limit)):
+                self.in_flight += 1
+                return
+            if self._wakeup is None or self._wakeup.is_set():
+                self._wakeup = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=pause if pause > 0 else None)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, outcome: str = "success", retry_after: Optional[float] = None) -> None:
+        """Free a slot and adapt the window to the outcome (success, throttled or error)
+
+        Synchronous so it can run from a cancellation handler.
+        """
+        self.in_flight -= 1
+        if outcome == "throttled":
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        elif outcome == "success":
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+
+class _Lane:
+    def __init__(self, limiter: "OutboundLimiter", requests: TokenBucket):
+        self.requests = requests
+        self.tokens = TokenBucket(limiter.tokens_per_minute / 60.0, limiter.tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(
+            limiter.initial_concurrency, maximum=limiter.max_concurrency
+        )
+
+
+class OutboundLimiter:
+    """Shared limiter for outbound Mistral calls, one lane per (API key, model)
+
+    Requests/sec is paced per API key, since that is how Mistral counts it; each lane
+    also paces tokens/min and adapts its concurrency window to observed 429s. Failed calls are retried individually with
+    jittered exponential backoff, honouring Retry-After. State is kept for the max_keys most recently used API keys.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 5.0,
+        tokens_per_minute: float = 500_000,
+        initial_concurrency: float = 8.0,
+        max_concurrency: float = 64.0,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30.0,
+        max_keys: int = 1024,
+    ):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.max_keys = max_keys
+        self._lanes: Dict[tuple[str, str], _Lane] = {}
+        # Least recently used API key first
+        self._request_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "failures": 0}
+
+    def lane(self, api_key: str, model: str) -> _Lane:
+        if api_key in self._request_buckets:
+            self._request_buckets.move_to_end(api_key)
+        else:
+            self._request_buckets[api_key] = TokenBucket(
+                self.requests_per_second, max(1.0, self.requests_per_second)
+            )
+            if len(self._request_buckets) > self.max_keys:
+                # Calls already holding the evicted lanes finish under them; new calls start afresh
+                evicted, _ = self._request_buckets.popitem(last=False)
+                for lane_key in [lane_key for lane_key in self._lanes if lane_key[0] == evicted]:
+                    del self._lanes[lane_key]
+        key = (api_key, model)
+        if key not in self._lanes:
+            self._lanes[key] = _Lane(self, self._request_buckets[api_key])
+        return self._lanes[key]
+
+    def concurrency_limits(self) -> Dict[str, float]:
+        """Current adaptive concurrency window per model, for diagnostics"""
+        return {model: lane.concurrency.limit for (_, model), lane in self._lanes.items()}
+
+    async def call(self, api_key: str, model: str, request: Callable[[], Awaitable[Any]], tokens: int = 0, idempotent: bool = True) -> Any:
+        """Run request() under the lane's limits, retrying retryable failures of this call only
+
+        A request that is not idempotent, such as a file upload, may have taken effect when it
+        failed with a 5xx or mid-transfer, so it is only retried after a 429 or a failed connect.
+        """
+        lane = self.lane(api_key, model)
+        attempt = 0
+        while True:
+            await lane.requests.acquire()
+            if tokens:
+                await lane.tokens.acquire(tokens)
+            await lane.concurrency.acquire()
+            self.stats["calls"] += 1
+            try:
+                result = await request()
+            except Exception as e:
+                status = error_status(e)
+                throttled = status == 429
+                retry_after = retry_after_seconds(e) if throttled else None
+                lane.concurrency.release("throttled" if throttled else "error", retry_after)
+                if throttled:
+                    self.stats["throttled"] += 1
+
+                if idempotent:
+                    retryable = status in RETRYABLE_STATUSES or isinstance(e, httpx.TransportError)
+                else:
+                    retryable = throttled or isinstance(e, UNSENT_ERRORS)
+                if not retryable or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    if throttled:
+                        raise RateLimitedError(f"Mistral rate limit exceeded for {model}: {e}", retry_after) from e
+                    raise
+
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                await asyncio.sleep(max(delay, retry_after or 0.0))
+                attempt += 1
+                self.stats["retries"] += 1
+                continue
+            except BaseException:
+                # Cancelled mid-call: give the slot back without counting it as a success
+                lane.concurrency.release("error")
+                raise
+            lane.concurrency.release()
+            return result
+
+
+def limiter_from_env() -> OutboundLimiter:
+    """Create the outbound limiter configured by MISTRAL_RATE_* environment variables"""
+    return OutboundLimiter(
+        requests_per_second=float(os.environ.get("MISTRAL_RATE_REQUESTS_PER_SECOND", "5")),
+        tokens_per_minute=float(os.environ.get("MISTRAL_RATE_TOKENS_PER_MINUTE", "500000")),
+        initial_concurrency=float(os.environ.get("MISTRAL_RATE_INITIAL_CONCURRENCY", "8")),
+        max_concurrency=float(os.environ.get("MISTRAL_RATE_MAX_CONCURRENCY", "64")),
+        max_retries=int(os.environ.get("MISTRAL_RATE_MAX_RETRIES", "5")),
+        backoff_base=float(os.environ.get("MISTRAL_RATE_BACKOFF_SECONDS", "0.5")),
+    )
@@ -1,79 +1,247 @@
-import subprocess
-import threading
+"""Run the API workers and the Streamlit UI under one supervisor
+
+N uvicorn workers (one per available CPU by default) accept connections from a single
+listening socket opened here. Streamlit is only started once the API answers /health,
+and the browser only once Streamlit is healthy. Children that exit unexpectedly are
+restarted with exponential backoff. SIGINT/SIGTERM stop every child with SIGTERM, so
+uvicorn drains in-flight requests, and kill whatever is left after the grace period.
+
+    python run_app.py
+    python run_app.py --workers 4 --no-ui
+"""
+import argparse
+import math
 import os
+import signal
+import socket
+import subprocess
+import sys
 import time
+import urllib.request
 import webbrowser
-import sys
-import signal
+from typing import List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+API_HEALTH_PATH = "/health"
+UI_HEALTH_PATH = "/_stcore/health"
+
+# Limits each worker process enforces on its own, with their defaults. They are configured for the whole
+# deployment and split across workers, so N workers do not send N times the Mistral budget or admit
+# N times the configured load. Rates are divided exactly; counts are rounded up to at least 1.
+# OCR_ADMISSION_MAX_ACTIVE defaults to OCR_MAX_CONCURRENT_DOCUMENTS, which is split already.
+SHARED_RATES = (
+    ("MISTRAL_RATE_REQUESTS_PER_SECOND", "5"),
+    ("MISTRAL_RATE_TOKENS_PER_MINUTE", "500000"),
+)
+SHARED_COUNTS = (
+    ("MISTRAL_RATE_INITIAL_CONCURRENCY", "8"),
+    ("MISTRAL_RATE_MAX_CONCURRENCY", "64"),
+    ("OCR_MAX_CONCURRENT_DOCUMENTS", "32"),
+    ("OCR_ADMISSION_MAX_ACTIVE", None),
+    ("OCR_ADMISSION_MAX_QUEUE", "64"),
+    ("OCR_ADMISSION_RESERVED_INTERACTIVE", "4"),
+    ("OCR_JOB_WORKERS", "4"),
+)
+
+# Set by the signal handlers; the main loop notices it and shuts down
+stopping = False
+
+
+class ManagedProcess:
+    """A child process that is restarted with exponential backoff whenever it exits unexpectedly"""
+
+    def __init__(self, name: str, cmd: List[str], pass_fds: Sequence[int] = (), min_backoff: float = 1.0, max_backoff: float = 30.0, stable_after: float = 60.0):
+        self.name = name
+        self.cmd = cmd
+        self.pass_fds = tuple(pass_fds)
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        # A child that stayed up this long is considered healthy again and restarts without delay
+        self.stable_after = stable_after
+        self.backoff = min_backoff
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restart_at: Optional[float] = None
+        self.restarts = 0
+
+    def start(self) -> None:
+        # Output goes straight to our stdout/stderr; the API already logs one JSON object per line
+        self.process = subprocess.Popen(self.cmd, pass_fds=self.pass_fds)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        print(f"[supervisor] started {self.name} (pid {self.process.pid})", flush=True)
+
+    def poll(self) -> None:
+        """Schedule a restart for a child that has exited and perform restarts that are due"""
+        now = time.monotonic()
+        if self.restart_at is not None:
+            if now >= self.restart_at:
+                self.restarts += 1
+                self.start()
+            return
+        if self.process is None or self.process.poll() is None:
+            return
+        uptime = now - self.started_at
+        if uptime >= self.stable_after:
+            self.backoff = self.min_backoff
+        print(f"[supervisor] {self.name} exited with code {self.process.returncode} after {uptime:.1f}s; "
+              f"restarting in {self.backoff:.0f}s", flush=True)
+        self.restart_at = now + self.backoff
+        self.backoff = min(self.max_backoff, self.backoff * 2)
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def terminate(self) -> None:
+        self.restart_at = None
+        if self.alive():
+            self.process.terminate()
+
+    def kill(self) -> None:
+        if self.alive():
+            print(f"[supervisor] {self.name} did not stop in time, killing it", flush=True)
+            self.process.kill()
+            self.process.wait()
+
+
+def default_workers() -> int:
+    """One worker per CPU this process may run on (which respects container CPU sets)"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def listen_socket(host: str, port: int) -> socket.socket:
+    """The listening socket every API worker accepts from"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def wait_ready(url: str, timeout: float, watched: Sequence[ManagedProcess]) -> bool:
+    """Poll url until it answers 200; gives up on timeout, shutdown, or when every watched child has died"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not stopping:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        for child in watched:
+            child.poll()
+        if watched and not any(child.alive() or child.restart_at is not None for child in watched):
+            return False
+        time.sleep(0.1)
+    return False
+
+
+def request_stop(signum, frame) -> None:
+    global stopping
+    stopping = True
+
+
+def shutdown(children: Sequence[ManagedProcess], grace: float) -> None:
+    """SIGTERM every child so it can drain, then kill those still running after the grace period"""
+    print("[supervisor] shutting down", flush=True)
+    for child in children:
+        child.terminate()
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline and any(child.alive() for child in children):
+        time.sleep(0.1)
+    for child in children:
+        child.kill()
+
+
+def split_limits(workers: int) -> None:
+    """Give each of the workers its share of the deployment-wide limits through the environment it inherits"""
+    for name, default in SHARED_RATES:
+        os.environ[name] = f"{float(os.environ.get(name, default)) / workers:g}"
+    for name, default in SHARED_COUNTS:
+        value = os.environ.get(name, default)
+        if value is not None:
+            os.environ[name] = str(max(1, math.ceil(int(float(value)) / workers)))
+
+
+def env_flag(name: str, default: str = "true") -> bool:
+    return os.environ.get(name, default).lower() not in ("0", "false", "no")
+
+
+def main():
+    # Read .env here rather than in each worker, so the limits split below are the configured ones
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("OCR_API_WORKERS", "0")),
+                        help="API worker processes (default: one per available CPU)")
+    parser.add_argument("--host", default=os.environ.get("OCR_API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("OCR_API_PORT", "8000")))
+    parser.add_argument("--ui-port", type=int, default=int(os.environ.get("OCR_UI_PORT", "8501")))
+    parser.add_argument("--no-ui", action="store_true", default=not env_flag("OCR_UI_ENABLED"), help="Run only the API")
+    parser.add_argument("--no-browser", action="store_true", default=not env_flag("OCR_OPEN_BROWSER"))
+    parser.add_argument("--grace", type=float, default=float(os.environ.get("OCR_SHUTDOWN_GRACE_SECONDS", "30")),
+                        help="Seconds workers get to finish in-flight requests on shutdown")
+    parser.add_argument("--ready-timeout", type=float, default=float(os.environ.get("OCR_READY_TIMEOUT_SECONDS", "60")))
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    workers = args.workers or default_workers()
+    if workers > 1:
+        # Let concurrent workers coalesce identical documents through a shared lease file
+        os.environ.setdefault("OCR_SINGLE_FLIGHT_LEASE_PATH", os.path.join(".cache", "single_flight.sqlite3"))
+    uvicorn = [sys.executable, "-m", "uvicorn", "app:app", "--timeout-graceful-shutdown", str(int(args.grace))]
+    if os.name == "posix":
+        sock = listen_socket(args.host, args.port)
+        api = [
+            ManagedProcess(f"api-{i}", uvicorn + ["--fd", str(sock.fileno())], pass_fds=[sock.fileno()])
+            for i in range(workers)
+        ]
+    else:
+        # Sharing a listening socket between processes needs POSIX descriptor passing
+        workers = 1
+        api = [ManagedProcess("api-0", uvicorn + ["--host", args.host, "--port", str(args.port)])]
+    if workers > 1:
+        split_limits(workers)
+    children = list(api)
+    for child in api:
+        child.start()
+
+    api_url = f"http://127.0.0.1:{args.port}"
+    started = time.monotonic()
+    if not wait_ready(api_url + API_HEALTH_PATH, args.ready_timeout, api):
+        if not stopping:
+            print(f"[supervisor] API did not become ready within {args.ready_timeout:g}s", flush=True)
+        shutdown(children, args.grace)
+        sys.exit(0 if stopping else 1)
+    print(f"[supervisor] API ready on {api_url} with {workers} workers after {time.monotonic() - started:.1f}s", flush=True)
+
+    if not args.no_ui:
+        ui = ManagedProcess("streamlit", [
+            sys.executable, "-m", "streamlit", "run", "streamlit_app.py",
+            "--server.headless", "true", "--server.port", str(args.ui_port),
+        ])
+        children.append(ui)
+        ui.start()
+        ui_url = f"http://localhost:{args.ui_port}"
+        if wait_ready(f"http://127.0.0.1:{args.ui_port}{UI_HEALTH_PATH}", args.ready_timeout, [ui]):
+            print(f"[supervisor] UI ready on {ui_url}", flush=True)
+            if not args.no_browser:
+                webbrowser.open(ui_url)
+        elif not stopping:
+            print(f"[supervisor] UI did not become ready within {args.ready_timeout:g}s; still supervising it", flush=True)
+
+    while not stopping:
+        for child in children:
+            child.poll()
+        time.sleep(0.5)
+    shutdown(children, args.grace)
 
-# Define commands to run FastAPI and Streamlit
-fastapi_cmd = ["uvicorn", "app:app", "--host", "0.0.0.0", "--port", "8000"]
-# Add --no-browser flag to prevent Streamlit from automatically opening a browser window
-streamlit_cmd = ["streamlit", "run", "streamlit_app.py", "--server.headless", "true"]
-
-processes = []
-
-def run_command(cmd, name):
-    """Run a command in a subprocess"""
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        universal_newlines=True,
-        bufsize=1
-    )
-    processes.append(process)
-    
-    print(f"\n[{name}] Starting process...")
-    
-    for line in process.stdout:
-        print(f"[{name}] {line.strip()}")
-    
-    process.wait()
-    if process.returncode != 0:
-        print(f"[{name}] Process exited with code {process.returncode}")
-
-def signal_handler(sig, frame):
-    """Handle termination signals"""
-    print("\nShutting down all processes...")
-    for process in processes:
-        process.terminate()
-    sys.exit(0)
-
-def open_browser():
-    """Open browser after a delay to ensure Streamlit server is ready"""
-    time.sleep(3)  # Wait a bit longer to ensure Streamlit is fully ready
-    print("Opening browser to Streamlit UI...")
-    webbrowser.open("http://localhost:8501")
 
 if __name__ == "__main__":
-    # Register signal handlers
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
-    # Start FastAPI in a separate thread
-    fastapi_thread = threading.Thread(target=run_command, args=(fastapi_cmd, "FastAPI"))
-    fastapi_thread.daemon = True
-    fastapi_thread.start()
-    
-    # Give FastAPI time to start
-    time.sleep(2)
-    
-    # Start Streamlit in a separate thread
-    streamlit_thread = threading.Thread(target=run_command, args=(streamlit_cmd, "Streamlit"))
-    streamlit_thread.daemon = True
-    streamlit_thread.start()
-    
-    # Open browser in yet another thread with a delay
-    browser_thread = threading.Thread(target=open_browser)
-    browser_thread.daemon = True
-    browser_thread.start()
-    
-    try:
-        # Keep the main thread alive
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\nShutting down...")
-        for process in processes:
-            process.terminate()
+    main()
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Literal, Optional, Type, Union
+
+from mistralai.extra.utils.response_format import response_format_from_pydantic_model
+from mistralai.models import ResponseFormat
+from pydantic import BaseModel, Field, create_model
+
+NAME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9_-]{0,63}$")
+_SCALARS = {"string": str, "integer": int, "number": float, "boolean": bool}
+# Nesting (objects, arrays and $refs) deeper than this is rejected, which also stops recursive $refs
+MAX_DEPTH = 8
+# Compiled models (and their response formats) kept per process; every account can register schemas
+MAX_COMPILED = 256
+
+
+class SchemaError(ValueError):
+    """Raised for a schema name or JSON schema the registry cannot compile"""
+
+
+def json_schema_fingerprint(schema: dict) -> str:
+    """Hash of a JSON schema in canonical form"""
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
+@lru_cache(maxsize=MAX_COMPILED)
+def response_format_for(response_model: Type[BaseModel]) -> ResponseFormat:
+    """Strict JSON-schema response format for a model, built once instead of on every chat call"""
+    return response_format_from_pydantic_model(response_model)
+
+
+def _model_name(name: str) -> str:
+    return "".join(part[:1].upper() + part[1:] for part in re.split(r"[-_]", name) if part)
+
+
+def _is_reserved(name: str) -> bool:
+    """Names pydantic models use for their own attributes (model_*, schema, json, copy, ...)"""
+    return name.startswith("model_") or hasattr(BaseModel, name)
+
+
+def _resolve(node: dict, root: dict) -> dict:
+    for _ in range(MAX_DEPTH):
+        ref = node.get("$ref")
+        if ref is None:
+            return node
+        if not isinstance(ref, str):
+            raise SchemaError(f"$ref must be a string, got {ref!r}")
+        prefix = next((p for p in ("#/$defs/", "#/definitions/") if ref.startswith(p)), None)
+        definitions = root.get(prefix[2:-1]) if prefix else None
+        target = definitions.get(ref[len(prefix):]) if isinstance(definitions, dict) else None
+        if not isinstance(target, dict):
+            raise SchemaError(f"Unsupported or missing $ref: {ref}")
+        node = target
+    raise SchemaError(f"$ref chain is longer than {MAX_DEPTH} at {node['$ref']}")
+
+
+def _field_type(node: Any, root: dict, name: str, path: str, depth: int) -> Any:
+    """Python type for a property schema; name is the model name for nested objects, path the JSON path for errors"""
+    if depth > MAX_DEPTH:
+        raise SchemaError(f"Schema is nested deeper than {MAX_DEPTH} levels at {path}")
+    if not isinstance(node, dict):
+        raise SchemaError(f"Schema at {path} must be an object")
+    node = _resolve(node, root)
+    if "enum" in node:
+        values = node["enum"]
+        if not isinstance(values, list) or not values:
+            raise SchemaError(f"enum at {path} must be a non-empty list")
+        if not all(value is None or isinstance(value, (str, int, float, bool)) for value in values):
+            raise SchemaError(f"enum at {path} may only contain strings, numbers, booleans and null")
+        return Literal[tuple(values)]
+    for combinator in ("anyOf", "oneOf"):
+        if combinator in node:
+            if not isinstance(node[combinator], list) or not node[combinator]:
+                raise SchemaError(f"{combinator} at {path} must be a non-empty list")
+            options = [_field_type(option, root, name, path, depth + 1) for option in node[combinator]]
+            return Union[tuple(options)]
+    kind = node.get("type")
+    if isinstance(kind, list):
+        if not kind or not all(isinstance(k, str) for k in kind):
+            raise SchemaError(f"type at {path} must be a string or a non-empty list of strings")
+        options = [_field_type({**node, "type": k}, root, name, path, depth + 1) for k in kind if k != "null"]
+        if not options:
+            return type(None)
+        resolved = Union[tuple(options)] if len(options) > 1 else options[0]
+        return Optional[resolved] if "null" in kind else resolved
+    if kind == "null":
+        return type(None)
+    if kind == "object" or "properties" in node:
+        if "properties" not in node:
+            return Dict[str, Any]
+        return _object_model(node, root, name, path, depth + 1)
+    if kind == "array":
+        return List[_field_type(node.get("items", {}), root, f"{name}Item", f"{path}[]", depth + 1)]
+    if isinstance(kind, str) and kind in _SCALARS:
+        return _SCALARS[kind]
+    if kind is None:
+        return Any
+    raise SchemaError(f"Unsupported type {kind!r} at {path}")
+
+
+def _object_model(node: dict, root: dict, name: str, path: str, depth: int) -> Type[BaseModel]:
+    properties = node["properties"]
+    if not isinstance(properties, dict):
+        raise SchemaError(f"properties at {path} must be an object")
+    required = node.get("required", [])
+    if not isinstance(required, list) or not all(isinstance(prop, str) for prop in required):
+        raise SchemaError(f"required at {path} must be a list of property names")
+    required = set(required)
+    fields = {}
+    for prop, prop_schema in properties.items():
+        if not prop.isidentifier() or prop.startswith("_"):
+            raise SchemaError(f"Property name {prop!r} at {path} is not a valid field name")
+        if _is_reserved(prop):
+            raise SchemaError(f"Property name {prop!r} at {path} is reserved")
+        annotation = _field_type(prop_schema, root, name + _model_name(prop), f"{path}.{prop}", depth)
+        description = prop_schema.get("description") if isinstance(prop_schema, dict) else None
+        if not isinstance(description, str):
+            description = None
+        if prop in required:
+            fields[prop] = (annotation, Field(..., description=description))
+        else:
+            fields[prop] = (Optional[annotation], Field(None, description=description))
+    return create_model(name, __doc__=node.get("description"), **fields)
+
+
+def compile_schema(name: str, schema: dict, envelope: Type[BaseModel]) -> Type[BaseModel]:
+    """Compile a JSON object schema into a subclass of envelope whose ocr_contents follow the schema"""
+    if not isinstance(schema, dict) or "properties" not in schema:
+        raise SchemaError("Schema must be a JSON object schema with properties")
+    try:
+        contents = _object_model(schema, schema, f"{_model_name(name)}Contents", "$", 0)
+        return create_model(f"{_model_name(name)}OCR", __base__=envelope, ocr_contents=(contents, ...))
+    except SchemaError:
+        raise
+    except Exception as e:
+        # Anything the checks above missed is still the schema's fault, not the server's
+        raise SchemaError(f"Schema could not be compiled: {e}") from e
+
+
+@dataclass(frozen=True)
+class CompiledSchema:
+    name: str
+    fingerprint: str
+    model: Type[BaseModel]
+
+
+class SchemaRegistry:
+    """Named JSON schemas for ocr_contents, stored in SQLite and compiled once per process
+
+    Schemas belong to an account (API key fingerprint): each account registers, replaces and
+    deletes its own names and only resolves those. Every worker sees schemas registered
+    through any of them; each worker compiles a schema the first time it is used and then
+    reuses the model (and, through response_format_for, its chat response format) until the
+    schema changes.
+    """
+
+    def __init__(self, path: str, envelope: Type[BaseModel], max_compiled: int = MAX_COMPILED):
+        self.envelope = envelope
+        self.max_compiled = max_compiled
+        # Least recently used first
+        self._compiled: "OrderedDict[tuple, CompiledSchema]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"compiled": 0, "lookups": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS schemas ("
+            "account TEXT NOT NULL, name TEXT NOT NULL, fingerprint TEXT NOT NULL, schema TEXT NOT NULL, "
+            "updated REAL NOT NULL, PRIMARY KEY (account, name))"
+        )
+
+    def _compile(self, name: str, fingerprint: str, schema: dict) -> CompiledSchema:
+        # The model depends only on the name and the schema, so accounts with identical schemas share it
+        compiled = self._compiled.get((name, fingerprint))
+        if compiled is None:
+            compiled = CompiledSchema(name, fingerprint, compile_schema(name, schema, self.envelope))
+            self._compiled[(name, fingerprint)] = compiled
+            self.stats["compiled"] += 1
+            if len(self._compiled) > self.max_compiled:
+                self._compiled.popitem(last=False)
+        else:
+            self._compiled.move_to_end((name, fingerprint))
+        return compiled
+
+    def register(self, account: str, name: str, schema: dict) -> CompiledSchema:
+        """Validate, compile and store a schema under an account's name, replacing any previous version"""
+        if not NAME_PATTERN.match(name):
+            raise SchemaError(f"Invalid schema name: {name}")
+        fingerprint = json_schema_fingerprint(schema)
+        with self._lock:
+            compiled = self._compile(name, fingerprint, schema)
+            self._db.execute(
+                "INSERT OR REPLACE INTO schemas (account, name, fingerprint, schema, updated) VALUES (?, ?, ?, ?, ?)",
+                (account, name, fingerprint, json.dumps(schema), time.time()),
+            )
+        return compiled
+
+    def get(self, account: str, name: str) -> Optional[CompiledSchema]:
+        """The compiled current version of an account's schema, or None if it has no such schema"""
+        with self._lock:
+            self.stats["lookups"] += 1
+            row = self._db.execute(
+                "SELECT fingerprint FROM schemas WHERE account = ? AND name = ?", (account, name)
+            ).fetchone()
+            if row is None:
+                return None
+            compiled = self._compiled.get((name, row[0]))
+            if compiled is not None:
+                self._compiled.move_to_end((name, row[0]))
+                return compiled
+            # Registered by another worker, or not used since this one started
+            (schema,) = self._db.execute(
+                "SELECT schema FROM schemas WHERE account = ? AND name = ?", (account, name)
+            ).fetchone()
+            return self._compile(name, row[0], json.loads(schema))
+
+    def schema(self, account: str, name: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT schema FROM schemas WHERE account = ? AND name = ?", (account, name)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def names(self, account: str) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, fingerprint, updated FROM schemas WHERE account = ? ORDER BY name", (account,)
+            ).fetchall()
+        return [{"name": name, "fingerprint": fingerprint, "updated_at": updated} for name, fingerprint, updated in rows]
+
+    def delete(self, account: str, name: str) -> bool:
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM schemas WHERE account = ? AND name = ?", (account, name))
+        return cursor.rowcount > 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def schema_registry_from_env(envelope: Type[BaseModel]) -> Optional[SchemaRegistry]:
+    """Create the schema registry configured by OCR_SCHEMA_REGISTRY_* environment variables"""
+    if os.environ.get("OCR_SCHEMA_REGISTRY_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    return SchemaRegistry(
+        os.environ.get("OCR_SCHEMA_REGISTRY_PATH", os.path.join(".cache", "schemas.sqlite3")),
+        envelope,
+    )
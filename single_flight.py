@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class LeaseStore:
+    """Short-lived per-key leases in a SQLite file shared by the API workers on one host"""
+
+    def __init__(self, path: str, lease_seconds: float = 900.0):
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+
+    def acquire(self, key: str) -> bool:
+        """Take the lease for key unless another process holds an unexpired one"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT owner, expires FROM leases WHERE key = ?", (key,)).fetchone()
+                if row and row[0] != self.owner and row[1] > now:
+                    return False
+                self._db.execute(
+                    "INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                    (key, self.owner, now + self.lease_seconds),
+                )
+                return True
+            finally:
+                self._db.execute("COMMIT")
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+            self._db.close()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one execution
+
+    Within a process, the first caller runs the work and every concurrent duplicate awaits
+    the same task, receiving the same result or the same exception. With a LeaseStore,
+    a worker that finds the key leased by another process waits for the lease to be
+    released and then calls recheck() (typically a result-cache lookup) before doing the
+    work itself; errors are not shared across processes.
+    """
+
+    def __init__(self, leases: Optional[LeaseStore] = None, poll_interval: float = 0.5):
+        self.leases = leases
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "cross_worker_waits": 0, "cross_worker_reused": 0}
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(
+        self,
+        key: str,
+        work: Callable[[], Awaitable[Any]],
+        recheck: Optional[Callable[[], Awaitable[Optional[Any]]]] = None,
+    ) -> tuple[Any, bool]:
+        """Run work() once per key at a time; returns (result, shared) where shared means it was coalesced"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task), True
+
+        self.stats["leaders"] += 1
+        task = asyncio.ensure_future(self._lead(key, work, recheck))
+        self._inflight[key] = task
+
+        def done(finished: asyncio.Future) -> None:
+            if self._inflight.get(key) is finished:
+                del self._inflight[key]
+            if not finished.cancelled():
+                # Mark the exception retrieved even if every caller went away
+                finished.exception()
+
+        task.add_done_callback(done)
+        # Shielded so a caller that disconnects does not cancel the work for the others
+        return await asyncio.shield(task), False
+
+    async def _lead(self, key: str, work: Callable[[], Awaitable[Any]], recheck: Optional[Callable[[], Awaitable[Optional[Any]]]]) -> Any:
+        if self.leases is None:
+            return await work()
+
+        waited = False
+        while not await asyncio.to_thread(self.leases.acquire, key):
+            if not waited:
+                self.stats["cross_worker_waits"] += 1
+                waited = True
+            await asyncio.sleep(self.poll_interval)
+        try:
+            if waited and recheck is not None:
+                result = await recheck()
+                if result is not None:
+                    self.stats["cross_worker_reused"] += 1
+                    return result
+            return await work()
+        finally:
+            await asyncio.to_thread(self.leases.release, key)
+
+
+def single_flight_from_env() -> Optional[SingleFlight]:
+    """Create the request coalescer configured by OCR_SINGLE_FLIGHT_* environment variables"""
+    if os.environ.get("OCR_SINGLE_FLIGHT_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    lease_path = os.environ.get("OCR_SINGLE_FLIGHT_LEASE_PATH")
+    leases = None
+    if lease_path:
+        leases = LeaseStore(lease_path, float(os.environ.get("OCR_SINGLE_FLIGHT_LEASE_SECONDS", "900")))
+    return SingleFlight(leases, poll_interval=float(os.environ.get("OCR_SINGLE_FLIGHT_POLL_SECONDS", "0.5")))
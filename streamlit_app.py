@@ -2,12 +2,16 @@ import streamlit as st
 import requests
 import json
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import tempfile
 from dotenv import load_dotenv
 import pandas as pd
-import base64
 import logging
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,6 +20,15 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+API_ENDPOINT = "http://localhost:8000/api/structured-ocr"
+# Documents submitted to the API at once; the API reserves interactive slots for the UI
+MAX_PARALLEL_UPLOADS = int(os.environ.get("OCR_UI_MAX_PARALLEL", "4"))
+# Results kept in Streamlit's cache, which every session and rerun shares
+RESULT_CACHE_ENTRIES = int(os.environ.get("OCR_UI_CACHE_ENTRIES", "64"))
+# Items of a list shown per table page, and characters of raw OCR text per viewer page
+TABLE_PAGE_ROWS = 100
+RAW_PAGE_CHARS = 20000
+
 # Apply custom CSS for table styling
 def apply_custom_css():
     st.markdown("""
@@ -61,26 +74,56 @@ def init_session_state():
         st.session_state.processing = False
     if "error" not in st.session_state:
         st.session_state.error = None
-    if "need_rerun" not in st.session_state:
-        st.session_state.need_rerun = False
+    if "history" not in st.session_state:
+        st.session_state.history = []
+    if "selected" not in st.session_state:
+        st.session_state.selected = None
+    if "result_json" not in st.session_state:
+        st.session_state.result_json = ""
 
 # Initialize session state
 init_session_state()
 
-def process_document(file, api_key):
-    """Process a document file with the API"""
-    API_ENDPOINT = "http://localhost:8000/api/structured-ocr"
+@st.cache_resource
+def http_session():
+    """One keep-alive connection pool to the API, shared by every session and upload thread"""
+    session = requests.Session()
+    # When the API sheds load with 503, retry up to twice after its Retry-After instead of failing the upload.
+    # Nothing else is retried: after a timeout or reset the API may still be processing the upload.
+    retry = Retry(total=None, connect=0, read=0, redirect=0, other=0, status=2, status_forcelist=(503,),
+                  allowed_methods=None, respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_maxsize=MAX_PARALLEL_UPLOADS, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def account_for(api_key):
+    """Fingerprint of an API key ("" for none, which the API serves with its own key); never the key itself"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else ""
+
+@st.cache_data(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def process_document(sha256, file_name, account, _content, _api_key):
+    """Process a document with the API, memoised by content hash, file name and account
+
+    The cache is shared by every browser session, so account (see account_for) keeps one
+    key's results from being served to sessions using another key or none.
+    Underscored arguments are not part of the cache key. Passing _content=None only
+    looks a result up, and raises LookupError once it has been evicted.
+    """
+    if _content is None:
+        raise LookupError(f"{file_name} is no longer cached; upload it again")
     
-    headers = {}
-    if api_key:
-        headers["X-API-Key"] = api_key
+    # Interactive lane, so uploads from the UI are not queued behind bulk jobs
+    headers = {"X-Priority": "interactive"}
+    if _api_key:
+        headers["X-API-Key"] = _api_key
     
     try:
         files = {
-            "file": (file.name, file, "application/octet-stream")
+            "file": (file_name, _content, "application/octet-stream")
         }
         
-        response = requests.post(
+        response = http_session().post(
             API_ENDPOINT, 
             headers=headers,
             files=files,
@@ -93,11 +136,8 @@ def process_document(file, api_key):
             logger.info(f"API Response Keys: {list(result.keys())}")
             if "raw_markdown" in result:
                 logger.info(f"Raw markdown found, length: {len(result['raw_markdown'])}")
-                logger.info(f"Raw markdown snippet: {result['raw_markdown'][:100]}...")
-                st.session_state.raw_ocr = result["raw_markdown"]
             else:
                 logger.warning("No raw_markdown field found in API response")
-                st.session_state.raw_ocr = None
             return result
         else:
             error_msg = f"Error: {response.status_code} - {response.text}"
@@ -105,16 +145,97 @@ def process_document(file, api_key):
             raise Exception(error_msg)
     except Exception as e:
         logger.exception("Failed to process document")
-        raise Exception(f"Failed to process document: {str(e)}")
+        raise Exception(f"Failed to process {file_name}: {str(e)}")
+
+def process_uploads(uploaded_files, api_key):
+    """Submit uploaded files concurrently with per-file progress; returns history entries and error messages"""
+    documents = []
+    for uploaded_file in uploaded_files:
+        content = uploaded_file.getvalue()
+        documents.append({"sha256": hashlib.sha256(content).hexdigest(), "file_name": uploaded_file.name, "content": content})
+    
+    progress = st.progress(0.0, text=f"Processing {len(documents)} document(s)...")
+    rows = [st.empty() for _ in documents]
+    for row, document in zip(rows, documents):
+        row.markdown(f"⏳ {document['file_name']}")
+    
+    processed, errors = [], []
+    account = account_for(api_key)
+    # Worker threads share this run's context, so the cache and session behave as in the script thread
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_UPLOADS, initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        futures = {
+            pool.submit(process_document, document["sha256"], document["file_name"], account, document["content"], api_key): index
+            for index, document in enumerate(documents)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            document = documents[index]
+            try:
+                future.result()
+                processed.append((index, {"sha256": document["sha256"], "file_name": document["file_name"], "account": account}))
+                rows[index].markdown(f"✅ {document['file_name']}")
+            except Exception as e:
+                errors.append(str(e))
+                rows[index].markdown(f"❌ {document['file_name']}")
+            progress.progress(done / len(documents), text=f"Processed {done} of {len(documents)} document(s)")
+    # In upload order rather than completion order
+    return [entry for _, entry in sorted(processed, key=lambda item: item[0])], errors
+
+def remember(entries):
+    """Put processed documents at the top of the sidebar history"""
+    keys = {(entry["sha256"], entry["file_name"]) for entry in entries}
+    history = [entry for entry in st.session_state.history if (entry["sha256"], entry["file_name"]) not in keys]
+    # Older entries would have been evicted from the result cache anyway
+    st.session_state.history = (entries + history)[:RESULT_CACHE_ENTRIES]
+
+def open_document(entry):
+    """Show a processed document, taking its result from the cache"""
+    try:
+        result = process_document(entry["sha256"], entry["file_name"], entry["account"], None, None)
+    except LookupError as e:
+        st.session_state.history = [item for item in st.session_state.history if item != entry]
+        st.session_state.error = str(e)
+        return
+    st.session_state.ocr_result = result
+    # Serialised once here rather than on every rerun that shows the download button
+    st.session_state.result_json = json.dumps(result, indent=2)
+    st.session_state.raw_ocr = result.get("raw_markdown")
+    st.session_state.file_name = entry["file_name"]
+    st.session_state.selected = entry
+    st.session_state.error = None
 
 def convert_to_displayable(value):
-    """Convert values to formats that can be displayed in Streamlit tables"""
+    """Convert values to strings that can be displayed in Streamlit tables"""
     if isinstance(value, list):
         return ", ".join(str(item) for item in value)
-    return value
+    if value is None:
+        return ""
+    # Columns mixing numbers and text cannot be converted for st.dataframe otherwise
+    return str(value)
+
+def widget_key(*parts):
+    """Widget key scoped to the open document, so page and section state does not carry over to another one"""
+    selected = st.session_state.selected or {}
+    return "-".join([selected.get("sha256", "")[:16], selected.get("file_name", "")] + [str(part) for part in parts])
+
+def paginate(total, page_size, key):
+    """Show a page selector when total items span several pages; returns the selected page's bounds"""
+    pages = max(1, -(-total // page_size))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1, key=key)
+    start = (page - 1) * page_size
+    return start, min(total, start + page_size)
+
+def items_table(items, start):
+    """One row per list item, with nested fields flattened into dotted columns"""
+    rows = pd.json_normalize([item if isinstance(item, dict) else {"value": item} for item in items])
+    rows.index = range(start + 1, start + len(rows) + 1)
+    return rows.apply(lambda column: column.map(convert_to_displayable))
 
 def display_nested_structure(data, parent_key=""):
-    """Recursively display nested structures"""
+    """Display nested structures, building nested sections only while they are switched on"""
     if isinstance(data, dict):
         # It's a dictionary, display as a table
         flat_items = {}
@@ -123,7 +244,7 @@ def display_nested_structure(data, parent_key=""):
         for key, value in data.items():
             display_key = key.replace("_", " ").title() if not parent_key else key
             
-            if isinstance(value, dict):
+            if isinstance(value, dict) or (isinstance(value, list) and value and isinstance(value[0], dict)):
                 nested_items[display_key] = value
             else:
                 flat_items[display_key] = convert_to_displayable(value)
@@ -133,19 +254,19 @@ def display_nested_structure(data, parent_key=""):
             section_title = parent_key.replace("_", " ").title() if parent_key else "Document Content"
             st.subheader(section_title)
             df = pd.DataFrame(list(flat_items.items()), columns=["Field", "Value"])
-            st.table(df)
+            st.dataframe(df, hide_index=True, width="stretch")
         
-        # Then recursively display nested items
+        # Then nested items, each behind a toggle: unlike an expander's, its contents are not built while it is off
         for section_key, section_data in nested_items.items():
             new_parent = f"{parent_key} - {section_key}" if parent_key else section_key
-            display_nested_structure(section_data, new_parent)
+            if st.toggle(f"Show {new_parent}", value=not parent_key, key=widget_key("section", new_parent)):
+                display_nested_structure(section_data, new_parent)
     
     elif isinstance(data, list) and data and isinstance(data[0], dict):
-        # It's a list of dictionaries, display each item
-        st.subheader(parent_key.replace("_", " ").title())
-        for idx, item in enumerate(data):
-            with st.expander(f"Item {idx+1}", expanded=idx==0):
-                display_nested_structure(item, f"{parent_key} Item {idx+1}")
+        # It's a list of dictionaries, display a page of it as one table with a row per item
+        st.subheader(f"{parent_key.replace('_', ' ').title()} ({len(data)} items)")
+        start, end = paginate(len(data), TABLE_PAGE_ROWS, widget_key("page", parent_key))
+        st.dataframe(items_table(data[start:end], start), width="stretch")
     
     else:
         # Simple value or list of simple values
@@ -166,25 +287,21 @@ def display_json_as_table(json_data):
     
     st.subheader("Document Metadata")
     metadata_df = pd.DataFrame(list(metadata.items()), columns=["Field", "Value"])
-    st.table(metadata_df)
-
-def create_download_json(data):
-    """Create a download link for JSON data"""
-    json_str = json.dumps(data, indent=2)
-    b64 = base64.b64encode(json_str.encode()).decode()
-    href = f'<a href="data:application/json;base64,{b64}" download="{st.session_state.file_name}_ocr_result.json">Download JSON Result</a>'
-    return href
+    st.dataframe(metadata_df, hide_index=True, width="stretch")
 
-def create_download_text(text, filename):
-    """Create a download link for text data"""
-    b64 = base64.b64encode(text.encode()).decode()
-    href = f'<a href="data:text/plain;base64,{b64}" download="{filename}">Download Raw OCR Text</a>'
-    return href
-
-# Check if we need to rerun the app (after processing is complete)
-if st.session_state.need_rerun:
-    st.session_state.need_rerun = False
-    st.rerun()
+def text_pages(text, page_chars):
+    """Split text into pages of at most page_chars characters, breaking at line ends where possible"""
+    pages = []
+    start = 0
+    while start < len(text):
+        end = start + page_chars
+        if end < len(text):
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        pages.append(text[start:end])
+        start = end
+    return pages
 
 # Sidebar for configuration
 with st.sidebar:
@@ -199,6 +316,19 @@ with st.sidebar:
     )
     st.session_state.api_key = api_key
     
+    if st.session_state.history:
+        st.markdown("---")
+        st.markdown("### Processed Documents")
+        for entry in st.session_state.history:
+            st.button(
+                entry["file_name"],
+                key=f"history-{entry['sha256']}-{entry['file_name']}",
+                on_click=open_document,
+                args=(entry,),
+                type="primary" if entry == st.session_state.selected else "secondary",
+                width="stretch",
+            )
+    
     st.markdown("---")
     st.markdown("""
     ### About
@@ -217,49 +347,47 @@ Upload a document to extract structured information using Mistral's powerful OCR
 """)
 
 # File uploader
-uploaded_file = st.file_uploader(
-    "Upload a document", 
+uploaded_files = st.file_uploader(
+    "Upload documents", 
     type=["pdf", "jpg", "jpeg", "png"],
-    help="Select a document file to process"
+    accept_multiple_files=True,
+    help="Select one or more document files to process"
 )
 
-if uploaded_file is not None:
-    # Display document preview
-    file_extension = Path(uploaded_file.name).suffix.lower()
-    
+if uploaded_files:
     col1, col2 = st.columns([1, 1])
     
     with col1:
         st.subheader("Document Preview")
-        if file_extension in [".jpg", ".jpeg", ".png"]:
-            st.image(uploaded_file, use_column_width=True)
-        elif file_extension == ".pdf":
-            st.markdown(f"PDF: {uploaded_file.name}")
-            # Can't display PDF preview directly in Streamlit
+        if len(uploaded_files) == 1:
+            uploaded_file = uploaded_files[0]
+            file_extension = Path(uploaded_file.name).suffix.lower()
+            if file_extension in [".jpg", ".jpeg", ".png"]:
+                st.image(uploaded_file, width="stretch")
+            elif file_extension == ".pdf":
+                st.markdown(f"PDF: {uploaded_file.name}")
+                # Can't display PDF preview directly in Streamlit
+        else:
+            st.markdown("\n".join(f"- {f.name} ({f.size / 1024:.0f} KB)" for f in uploaded_files))
 
     with col2:
-        st.subheader("Process Document")
-        process_button = st.button("Extract Information", use_container_width=True, type="primary")
+        st.subheader("Process Documents" if len(uploaded_files) > 1 else "Process Document")
+        process_button = st.button("Extract Information", width="stretch", type="primary")
         
         if process_button:
             if st.session_state.processing:
                 st.warning("Processing already in progress...")
             else:
                 st.session_state.processing = True
-                st.session_state.file_name = uploaded_file.name
-                
-                with st.spinner("Processing document... (This may take 30-60 seconds)"):
-                    try:
-                        result = process_document(uploaded_file, st.session_state.api_key)
-                        st.session_state.ocr_result = result
-                        st.session_state.error = None
-                    except Exception as e:
-                        st.session_state.error = str(e)
-                        st.session_state.ocr_result = None
-                    finally:
-                        st.session_state.processing = False
-                        st.session_state.need_rerun = True
-                        st.rerun()
+                try:
+                    processed, errors = process_uploads(uploaded_files, st.session_state.api_key)
+                finally:
+                    st.session_state.processing = False
+                remember(processed)
+                if processed:
+                    open_document(processed[0])
+                st.session_state.error = "\n\n".join(errors) or None
+                st.rerun()
 
 # Display results or error
 if st.session_state.error:
@@ -276,8 +404,13 @@ if st.session_state.ocr_result:
             # Display JSON data as tables
             display_json_as_table(st.session_state.ocr_result)
             
-            # Download structured data
-            st.markdown(create_download_json(st.session_state.ocr_result), unsafe_allow_html=True)
+            # Download structured data; served as a file rather than inlined into the page
+            st.download_button(
+                "Download JSON Result",
+                data=st.session_state.result_json,
+                file_name=f"{st.session_state.file_name}_ocr_result.json",
+                mime="application/json",
+            )
         except Exception as e:
             st.error(f"Error displaying structured results: {str(e)}")
             st.json(st.session_state.ocr_result)  # Fallback to raw JSON display
@@ -287,11 +420,17 @@ if st.session_state.ocr_result:
         
         if "raw_markdown" in st.session_state.ocr_result and st.session_state.ocr_result["raw_markdown"]:
             raw_text = st.session_state.ocr_result["raw_markdown"]
-            st.text_area("", value=raw_text, height=400, disabled=True, key="raw_ocr_text")
+            pages = text_pages(raw_text, RAW_PAGE_CHARS)
+            start, _ = paginate(len(pages), 1, widget_key("raw-page"))
+            st.text_area("Raw OCR Text", value=pages[start], height=400, disabled=True, label_visibility="collapsed")
             
             # Add download button for raw text
-            st.markdown(create_download_text(raw_text, f"{st.session_state.file_name}_raw_ocr.txt"), 
-                        unsafe_allow_html=True)
+            st.download_button(
+                "Download Raw OCR Text",
+                data=raw_text,
+                file_name=f"{st.session_state.file_name}_raw_ocr.txt",
+                mime="text/plain",
+            )
         else:
             st.error("Raw OCR text is not available.")
             st.write("This might happen for several reasons:")
@@ -0,0 +1,263 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Seconds; spans a cache hit up to a slow multi-chunk PDF
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+BYTE_BUCKETS = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000, 100_000_000)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> List[str]:
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def _render_value(self, key: tuple, state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            labels = _label_text(self.labelnames, key, f'le="{_number(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _label_text(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_number(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class Registry:
+    """Process-local metric registry rendered in the Prometheus text format
+
+    Every API worker process keeps its own registry; scrape each worker, or run one.
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "ocr_stage_duration_seconds", "Duration of each pipeline stage", ["stage"]
+))
+STAGE_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ocr_stage_in_flight", "Pipeline stages currently running", ["stage"]
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "ocr_stage_errors_total", "Pipeline stage failures by exception type", ["stage", "error"]
+))
+PAYLOAD_BYTES = REGISTRY.register(Histogram(
+    "ocr_payload_bytes", "Size of documents and OCR output by kind", ["kind"], buckets=BYTE_BUCKETS
+))
+DOCUMENT_PAGES = REGISTRY.register(Histogram(
+    "ocr_document_pages", "Pages returned by OCR per document", buckets=PAGE_BUCKETS
+))
+PDF_PAGES = REGISTRY.register(Counter(
+    "ocr_pdf_pages_total", "PDF pages by where their markdown came from", ["source"]
+))
+PROMPT_TOKENS = REGISTRY.register(Counter(
+    "ocr_prompt_tokens_total", "Estimated chat prompt tokens before and after compaction", ["kind"]
+))
+COALESCED_CALLS = REGISTRY.register(Counter(
+    "ocr_coalesced_requests_total", "Requests that shared an identical in-flight document's result"
+))
+ADMISSION_ACTIVE = REGISTRY.register(Gauge(
+    "ocr_admission_active", "Requests holding an admission slot"
+))
+ADMISSION_QUEUED = REGISTRY.register(Gauge(
+    "ocr_admission_queued", "Requests waiting for an admission slot", ["lane"]
+))
+ADMISSION_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "ocr_admission_wait_seconds", "Time queued requests waited for a slot", ["lane"]
+))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "ocr_admission_rejected_total", "Requests shed with 503 because the worker was at capacity", ["lane", "reason"]
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "ocr_http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "ocr_http_request_duration_seconds", "Time to produce the response headers", ["method", "route"]
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "ocr_http_requests_in_flight", "HTTP requests currently being handled"
+))
+
+# Per-request stage durations for the Server-Timing header; tasks spawned by a request share its list
+_request_timings: contextvars.ContextVar[Optional[List[tuple]]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> List[tuple]:
+    """Begin collecting (stage, seconds) pairs for the current request"""
+    timings: List[tuple] = []
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time a pipeline stage: histogram, in-flight gauge, error counter and Server-Timing entry"""
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_IN_FLIGHT.dec(stage=stage)
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing_header(timings: List[tuple], total: Optional[float] = None) -> str:
+    """Format stage timings as a Server-Timing header, summing repeated stages"""
+    totals: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+        counts[stage] = counts.get(stage, 0) + 1
+    entries = []
+    for stage, seconds in totals.items():
+        entry = f"{stage};dur={seconds * 1000:.1f}"
+        if counts[stage] > 1:
+            entry += f';desc="{counts[stage]} calls"'
+        entries.append(entry)
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+# Attributes every LogRecord has; anything else was passed through extra= and is logged as a field
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message, level, logger and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_FIELDS and not name.startswith("_"):
+                entry[name] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging_from_env() -> None:
+    """Configure root logging from OCR_LOG_LEVEL and OCR_LOG_FORMAT (json or text)"""
+    handler = logging.StreamHandler()
+    if os.environ.get("OCR_LOG_FORMAT", "json").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.environ.get("OCR_LOG_LEVEL", "INFO").upper())
+    # One line per outbound HTTP call drowns out everything else at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -0,0 +1,19 @@
+from markdown_parser import parse_markdown
+
+
+def test_text_field_does_not_collide_with_text_lines():
+    assert parse_markdown("Text: foo\nbar baz") == {"text_field": "foo", "text": ["bar baz"]}
+
+
+def test_tables_field_does_not_collide_with_tables():
+    parsed = parse_markdown("Tables: 2\n\n| a | b |\n|---|---|\n| 1 | 2 |")
+    assert parsed == {"tables_field": "2", "tables": [[{"a": "1", "b": "2"}]]}
+
+
+def test_repeated_reserved_fields_are_collected():
+    assert parse_markdown("Text: one\nText: two") == {"text_field": ["one", "two"]}
+
+
+def test_heading_named_like_a_reserved_list():
+    parsed = parse_markdown("# tables\n| a |\n|---|\n| 1 |\nloose line")
+    assert parsed == {"tables (2)": {"tables": [[{"a": "1"}]], "text": ["loose line"]}}
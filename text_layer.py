@@ -0,0 +1,162 @@
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from document import open_content
+
+logger = logging.getLogger(__name__)
+
+# pypdf is imported on first use, as in large_document
+
+_COLUMN_GAP = re.compile(r"\s{2,}")
+_INLINE_SPACE = re.compile(r"[ \t]+")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+# Characters pypdf emits for glyphs it cannot map to Unicode
+_UNMAPPED = re.compile(r"�|\(cid:\d+\)")
+
+# Consecutive lines with the same number of columns before they are treated as a table
+MIN_TABLE_ROWS = 3
+
+
+@dataclass(frozen=True)
+class TextLayerConfig:
+    """When a PDF page's embedded text is trusted instead of sending the page to OCR"""
+
+    enabled: bool = True
+    min_chars: int = 50
+    # Pages with images need this much text, or the images probably hold the content (scans)
+    min_chars_with_images: int = 400
+    min_clean_ratio: float = 0.9
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable description of the settings, part of the result cache key"""
+        if not self.enabled:
+            return "text-layer:off"
+        return f"text-layer:{self.min_chars}:{self.min_chars_with_images}:{self.min_clean_ratio}"
+
+
+def _has_images(page) -> bool:
+    """Whether the page draws any image XObjects, directly or through form XObjects, checked without decoding them"""
+    return _draws_images(page.get("/Resources"), set())
+
+
+def _draws_images(resources, seen: set) -> bool:
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    if xobjects is None:
+        return False
+    for reference in xobjects.get_object().values():
+        # Forms are often shared between pages and may (in broken files) contain themselves
+        ident = (reference.idnum, reference.generation) if hasattr(reference, "idnum") else None
+        if ident in seen:
+            continue
+        if ident is not None:
+            seen.add(ident)
+        xobject = reference.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            return True
+        if subtype == "/Form" and _draws_images(xobject.get("/Resources"), seen):
+            return True
+    return False
+
+
+def _clean_ratio(text: str) -> float:
+    visible = [c for c in text if not c.isspace()]
+    if not visible:
+        return 0.0
+    unmapped = sum(len(match) for match in _UNMAPPED.findall(text))
+    printable = sum(1 for c in visible if c.isprintable())
+    return max(0.0, (printable - unmapped) / len(visible))
+
+
+def usable_text(text: str, has_images: bool, config: TextLayerConfig) -> bool:
+    """Whether extracted page text is complete and clean enough to skip OCR"""
+    chars = len(text.strip())
+    needed = config.min_chars_with_images if has_images else config.min_chars
+    return chars >= needed and _clean_ratio(text) >= config.min_clean_ratio
+
+
+def _table(rows: List[List[str]]) -> List[str]:
+    header, body = rows[0], rows[1:]
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    lines.extend("| " + " | ".join(cells) + " |" for cells in body)
+    return lines
+
+
+def layout_to_markdown(text: str) -> str:
+    """Turn layout-preserving extracted text into markdown, recognising column-aligned tables"""
+    out: List[str] = []
+    block: List[List[str]] = []
+
+    def flush() -> None:
+        if len(block) >= MIN_TABLE_ROWS:
+            out.extend([""] + _table(block) + [""])
+        else:
+            out.extend(" ".join(cells) for cells in block)
+        block.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        cells = _COLUMN_GAP.split(stripped) if stripped else []
+        if len(cells) >= 2 and (not block or len(cells) == len(block[0])):
+            block.append(cells)
+            continue
+        flush()
+        if len(cells) >= 2:
+            block.append(cells)
+        else:
+            out.append(_INLINE_SPACE.sub(" ", stripped))
+    flush()
+    return _BLANK_RUNS.sub("\n\n", "\n".join(out)).strip()
+
+
+def extract_text_pages(content: bytes, config: TextLayerConfig) -> List[Optional[dict]]:
+    """Per page, an OCR-shaped page dict built from the text layer, or None if the page needs OCR
+
+    Unparseable PDFs return an empty list, leaving the whole document to the OCR service.
+    """
+    if not config.enabled:
+        return []
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(open_content(content))
+        pages = list(reader.pages)
+    except Exception as e:
+        # pypdf raises ValueError, KeyError, RecursionError, ... as well as PyPdfError on malformed files
+        logger.warning(f"Text layer unavailable, sending the whole PDF to OCR: {e!r}")
+        return []
+
+    results: List[Optional[dict]] = []
+    for index, page in enumerate(pages):
+        try:
+            text = page.extract_text(extraction_mode="layout")
+            has_images = _has_images(page)
+        except Exception:
+            # Broken content streams or fonts: let OCR look at the rendered page instead
+            results.append(None)
+            continue
+        if not usable_text(text, has_images, config):
+            results.append(None)
+            continue
+        box = page.mediabox
+        results.append({
+            "index": index,
+            "markdown": layout_to_markdown(text),
+            "images": [],
+            "dimensions": {"dpi": 72, "height": int(float(box.height)), "width": int(float(box.width))},
+        })
+    return results
+
+
+def config_from_env() -> TextLayerConfig:
+    """Create the text-layer settings from OCR_TEXT_LAYER_* environment variables"""
+    return TextLayerConfig(
+        enabled=os.environ.get("OCR_TEXT_LAYER_ENABLED", "true").lower() not in ("0", "false", "no"),
+        min_chars=int(os.environ.get("OCR_TEXT_LAYER_MIN_CHARS", "50")),
+        min_chars_with_images=int(os.environ.get("OCR_TEXT_LAYER_MIN_CHARS_WITH_IMAGES", "400")),
+        min_clean_ratio=float(os.environ.get("OCR_TEXT_LAYER_MIN_CLEAN_RATIO", "0.9")),
+    )